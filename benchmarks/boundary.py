@@ -0,0 +1,148 @@
+"""
+评测行政区划边界的冷启动耗时：比较直接读取 shapefile 与读取转存的 Parquet 边界文件。
+
+每种情况在独立的进程中运行，以排除进程内缓存的影响。每个进程导入绘图模块，在 `EXTENT`（论文天气图的范围，
+兰伯特投影）上绘制 `Map.common()` 中的省界、广州市和白云区边界并渲染一次。海岸线来自 Natural Earth，
+与边界文件的格式无关，不计入。
+
+默认读取 lib/ChinaAdminDivisonSHP 子模块；子模块不存在时生成一套合成的 shapefile 代替，
+并在输出中注明。合成图层的条数与真实数据相近（省 34、市 370、区县 2900），每个多边形 `VERTICES` 个顶点。
+
+结果（单核，合成图层，district.shp 44 MB，三次取最小值；no boundary 为导入、建图与渲染的固定开销）：
+
+    no boundary    2.0 s
+    shapefile      9.0 s
+    parquet        2.5 s
+
+即边界部分从约 7.0 s 降到约 0.5 s。真实 shapefile 上的结果尚未测得，需要在检出子模块的环境中重新运行本脚本。
+
+用法：uv run python -m benchmarks.boundary [shapefile 目录]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from os import path
+
+import numpy as np
+
+from lib.boundary import LAYERS, SHP_DIR
+
+EXTENT = (60, 140, 10, 60)
+"""绘制范围（西、东、南、北），同 ERA5 数据的范围"""
+
+VERTICES = 1000
+"""合成图层中每个多边形的顶点数"""
+
+COLD_START = """
+import time
+start = time.perf_counter()
+import matplotlib
+matplotlib.use("Agg")
+import lib.boundary
+lib.boundary.SHP_DIR = {shp_dir!r}
+lib.boundary.STORE_DIR = {store_dir!r}
+from lib.map import Map
+map = Map(None, extent={extent!r})
+if {boundaries!r}:
+    map.draw_province().draw_guangzhou_city().draw_baiyun_district()
+map.fig.canvas.draw()
+print(time.perf_counter() - start)
+"""
+
+
+def cold_start(shp_dir: str, store_dir: str, boundaries: bool = True) -> float:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            COLD_START.format(
+                shp_dir=shp_dir,
+                store_dir=store_dir,
+                extent=EXTENT,
+                boundaries=boundaries,
+            ),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _polygons(count: int, rng: np.random.Generator):
+    # 在 73°–135°E、18°–53°N 内按网格排列的不规则多边形
+    columns = int(np.ceil(np.sqrt(count * 62 / 35)))
+    rows = int(np.ceil(count / columns))
+    width, height = 62 / columns, 35 / rows
+    angles = np.linspace(0, 2 * np.pi, VERTICES, endpoint=False)
+    for i in range(count):
+        x = 73 + (i % columns + 0.5) * width
+        y = 18 + (i // columns + 0.5) * height
+        radius = 0.5 * (1 + 0.1 * rng.standard_normal(VERTICES))
+        ring = np.column_stack(
+            [
+                x + width * radius * np.cos(angles),
+                y + height * radius * np.sin(angles),
+            ]
+        )
+        # shapefile 的外环按顺时针排列
+        yield [ring[::-1].tolist() + [ring[-1].tolist()]]
+
+
+def synthetic_shapefiles(directory: str):
+    """
+    在 `directory` 中生成与 `LAYERS` 目录结构相同的合成图层，包含 `Map.common()` 用到的名称。
+    """
+    import shapefile
+
+    rng = np.random.default_rng(0)
+    counts = {"country": 1, "province": 34, "city": 370, "district": 2900}
+    for name, count in counts.items():
+        target = path.join(directory, LAYERS[name])
+        os.makedirs(path.dirname(target), exist_ok=True)
+        with shapefile.Writer(target, shapeType=shapefile.POLYGON) as writer:
+            for field in ("pr_name", "ct_name", "dt_name"):
+                writer.field(field, "C", 50)
+            for i, rings in enumerate(_polygons(count, rng)):
+                names = [f"省{i}", f"市{i}", f"区{i}"]
+                if name == "province" and i < 3:
+                    names[0] = ("广东省", "香港特别行政区", "澳门特别行政区")[i]
+                elif name in ("city", "district") and i == 0:
+                    names[1:] = ["广州市", "白云区"]
+                writer.poly(rings)
+                writer.record(*names)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        shp_dir = sys.argv[1] if len(sys.argv) > 1 else SHP_DIR
+        if not all(path.exists(path.join(shp_dir, shp)) for shp in LAYERS.values()):
+            print(f"{shp_dir} not found, using synthetic shapefiles")
+            shp_dir = path.join(workdir, "shp")
+            synthetic_shapefiles(shp_dir)
+        size = path.getsize(path.join(shp_dir, LAYERS["district"]))
+        print(f"district.shp {size / 1024**2:.0f} MB")
+
+        # 每次运行前清空，保证读取的是 shapefile
+        empty = path.join(workdir, "empty")
+        shapefile_times = []
+        for _ in range(3):
+            shutil.rmtree(empty, ignore_errors=True)
+            shapefile_times.append(cold_start(shp_dir, empty))
+
+        # 上面最后一次运行已把各图层转存到 `empty`
+        store_times = [cold_start(shp_dir, empty) for _ in range(3)]
+        # 导入、建图与渲染的固定开销
+        base_times = [cold_start(shp_dir, empty, False) for _ in range(3)]
+
+    print(f"{'no boundary':<12}{min(base_times):>8.3f}s")
+    print(f"{'shapefile':<12}{min(shapefile_times):>8.3f}s")
+    print(f"{'parquet':<12}{min(store_times):>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+评测一张图输出多种格式的耗时：比较逐个保存与 `lib.export.save_all`。
+
+输出 SVG（论文）、150 dpi PNG（幻灯片）和 480 像素宽的 JPEG 缩略图（网页索引）。
+数据同 `benchmarks.map_frames`，另加细尺度扰动，使填色图接近实际数据的复杂程度。
+
+用法：uv run python -m benchmarks.export_formats [重复次数]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+from benchmarks.map_frames import LEVELS, dataset
+from lib.export import Export, save
+from lib.map import Map
+
+THUMBNAIL_WIDTH = 480
+
+
+def figure(ds) -> Map:
+    data = ds.isel(valid_time=0, pressure_level=0).load()
+    noise = np.random.default_rng(0).standard_normal(data["u"].shape)
+    speed = np.hypot(data["u"], data["v"]) + 20 * np.abs(gaussian_filter(noise, 1.5))
+    map = Map(ds).gridlines()
+    map.contourf(speed, levels=np.arange(0, 40, 2), cmap="YlOrBr")
+    ct = map.contour(data["z_dagpm"], levels=LEVELS, colors="black")
+    map.ax.clabel(ct, inline=True, fontsize=10, fmt="%1.0f")
+    map.barbs(map.thin(data), "u", "v")
+    map.title("export", fontsize=20)
+    return map
+
+
+def separately(map: Map, directory: str) -> float:
+    start = time.perf_counter()
+    save(map.fig, os.path.join(directory, "a.svg"), axes=[map.ax])
+    map.fig.savefig(os.path.join(directory, "a.png"), dpi=150)
+    width = map.fig.get_size_inches()[0]
+    map.fig.savefig(os.path.join(directory, "a.jpg"), dpi=THUMBNAIL_WIDTH / width)
+    return time.perf_counter() - start
+
+
+def together(map: Map, directory: str) -> float:
+    start = time.perf_counter()
+    reports = map.save_all(
+        [
+            os.path.join(directory, "b.svg"),
+            Export(os.path.join(directory, "b.png"), dpi=150),
+            Export(os.path.join(directory, "b.jpg"), width=THUMBNAIL_WIDTH),
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    for report in reports:
+        print(f"    {report}")
+    return elapsed
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    map = figure(dataset(1))
+    with tempfile.TemporaryDirectory() as directory:
+        map.fig.canvas.draw()
+        single = min(
+            save(map.fig, os.path.join(directory, "svg.svg"), axes=[map.ax]).seconds
+            for _ in range(repeats)
+        )
+        a = min(separately(map, directory) for _ in range(repeats))
+        b = min(together(map, directory) for _ in range(repeats))
+        sizes = {
+            ext: (
+                os.path.getsize(os.path.join(directory, f"a.{ext}")),
+                os.path.getsize(os.path.join(directory, f"b.{ext}")),
+            )
+            for ext in ("svg", "png", "jpg")
+        }
+    plt.close(map.fig)
+    print(f"{'SVG only':<22}{single:>8.2f}s")
+    print(f"{'save per format':<22}{a:>8.2f}s")
+    print(f"{'save_all':<22}{b:>8.2f}s")
+    # SVG 都按 `RASTER_LAYERS` 栅格化，两种方式的差别只在位图输出
+    for ext, (size_a, size_b) in sizes.items():
+        print(f"{ext:<6}{size_a / 1024:>10.0f} KB{size_b / 1024:>10.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+评测多帧天气图的渲染速度：比较每帧新建 `Map` 与使用 `MapTemplate` 复用背景。
+
+数据由 `lib.era5.local_client.synthesize` 合成，不需要下载 ERA5。静态图层只包含经纬网，
+不依赖行政区划与 Natural Earth 数据；实际使用时背景越复杂，模板的收益越大。
+
+用法：uv run python -m benchmarks.map_frames [帧数]
+"""
+
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from lib.data import with_derived
+from lib.era5.local_client import synthesize
+from lib.map import Map
+from lib.template import MapTemplate
+
+LEVELS = np.arange(0, 1000, 4)
+
+
+def dataset(frames: int):
+    request = {
+        "year": ["2024"],
+        "month": ["04"],
+        "day": [f"{d:02d}" for d in range(1, frames // 24 + 2)],
+        "time": [f"{h:02d}:00" for h in range(24)],
+        "pressure_level": ["500"],
+        "area": [60, 60, 10, 140],
+        "variable": ["geopotential", "u_component_of_wind", "v_component_of_wind"],
+    }
+    ds = synthesize(request, request["variable"]).isel(valid_time=slice(frames))
+    # 合成数据换算成接近实际的量级：位势约 5500 gpm，风速约 ±20 m/s
+    lon, lat = np.meshgrid(ds.longitude, ds.latitude)
+    phase = np.arange(ds.sizes["valid_time"])[:, None, None, None] / 6
+    wave = np.sin(np.radians(lon) * 6 + phase) * np.cos(np.radians(lat) * 4)
+    ds["z"] = ds["z"] * 0 + (5600 + 40 * wave) * 9.80665
+    ds["u"] = ds["u"] * 0 + 20 * wave
+    ds["v"] = ds["v"] * 0 + 10 * np.cos(np.radians(lon) * 3 + phase)
+    return with_derived(ds)
+
+
+def frame_data(ds, i: int):
+    data = ds[["z_dagpm", "u", "v"]].isel(valid_time=i, pressure_level=0).load()
+    thinned = data.isel(longitude=slice(None, None, 15), latitude=slice(None, None, 15))
+    return data, thinned
+
+
+def rebuild(ds, frames: int) -> float:
+    start = time.perf_counter()
+    for i in range(frames):
+        data, thinned = frame_data(ds, i)
+        map = Map(ds).gridlines()
+        ct = map.contour(data["z_dagpm"], levels=LEVELS, colors="black")
+        map.ax.clabel(ct, inline=True, fontsize=10, fmt="%1.0f")
+        map.barbs(thinned, "u", "v")
+        map.title(f"frame {i}", fontsize=20)
+        map.fig.canvas.draw()
+        np.array(map.fig.canvas.buffer_rgba())
+        plt.close(map.fig)
+    return frames / (time.perf_counter() - start)
+
+
+def templated(ds, frames: int) -> float:
+    template = MapTemplate(Map(ds).gridlines().title("frame", fontsize=20))
+
+    def draw(template: MapTemplate, i: int):
+        data, thinned = frame_data(ds, i)
+        ct = template.contour(data["z_dagpm"], levels=LEVELS, colors="black")
+        template.clabel(ct, inline=True, fontsize=10, fmt="%1.0f")
+        template.barbs(thinned, "u", "v")
+        template.title(f"frame {i}", fontsize=20)
+
+    for i in range(frames):
+        template.render(lambda t: draw(t, i))
+    plt.close(template.fig)
+    return template.fps
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    ds = dataset(frames)
+    print(f"{frames} frames")
+    print(f"{'rebuild figure':<18}{rebuild(ds, frames):>8.2f} fps")
+    print(f"{'MapTemplate':<18}{templated(ds, frames):>8.2f} fps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+评测 MICAPS 站点文件解析：比较逐字符流式解析与原先的 `ast.literal_eval` 解析，以及 Parquet 缓存命中时的读取。
+
+用法：uv run python -m benchmarks.read_micaps [站点数]
+"""
+
+import ast
+import random
+import sys
+import tempfile
+import time
+from os import path
+
+import pandas as pd
+
+from lib.micaps_cache import ParquetCache, cached_read_micaps
+from lib.read_micaps import columns, read_micaps
+
+HEADER = ["diamond 3 synthetic", "2024 04 27 08", "0", "0", "0"]
+
+
+def read_micaps_literal(fname: str, encoding="gb18030") -> pd.DataFrame:
+    """原先的实现：整份读入，改写为字典字面量后用 ast 解析"""
+    txt = (
+        open(fname, "r", encoding=encoding)
+        .read()
+        .strip()
+        .splitlines()[5]
+        .replace("=", ":")
+    )
+    data_dict = ast.literal_eval(txt)
+    df = pd.DataFrame.from_dict(data_dict, orient="index")
+    df.rename(columns=columns, inplace=True)
+    return df
+
+
+def synthesize(fname: str, stations: int):
+    rng = random.Random(0)
+    codes = [code for code in columns if code != 21]
+    blocks = []
+    for i in range(stations):
+        items = [f'21="站{i}"'] + [
+            f"{code}={rng.uniform(-50, 1050):.1f}" for code in codes
+        ]
+        blocks.append(f"{50000 + i}={{{','.join(items)}}}")
+    with open(fname, "w", encoding="gb18030") as f:
+        f.write("\n".join(HEADER) + "\n{" + ",".join(blocks) + "}\n")
+
+
+def timed(label: str, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"{label:<28}{time.perf_counter() - start:>8.3f}s")
+    return result
+
+
+def main():
+    stations = int(sys.argv[1]) if len(sys.argv) > 1 else 2400
+    with tempfile.TemporaryDirectory() as workdir:
+        fname = path.join(workdir, "synthetic.000")
+        synthesize(fname, stations)
+        print(f"{stations} stations, {path.getsize(fname) / 1048576:.1f} MiB")
+        old = timed("ast.literal_eval", read_micaps_literal, fname)
+        new = timed("streaming parser", read_micaps, fname, cache=False)
+        projected = timed(
+            "streaming, 3 columns",
+            read_micaps,
+            fname,
+            usecols=[401, 601, 801],
+            cache=False,
+        )
+        cache = ParquetCache(path.join(workdir, "cache"))
+        timed("cache miss", cached_read_micaps, fname, cache=cache)
+        cached = timed("cache hit", cached_read_micaps, fname, cache=cache)
+        timed(
+            "cache hit, 3 columns",
+            cached_read_micaps,
+            fname,
+            usecols=[401, 601, 801],
+            cache=cache,
+        )
+        pd.testing.assert_frame_equal(old, new, check_dtype=False)
+        pd.testing.assert_frame_equal(new, cached)
+        pd.testing.assert_frame_equal(
+            old[projected.columns], projected, check_dtype=False
+        )
+        print("results match")
+
+
+if __name__ == "__main__":
+    main()
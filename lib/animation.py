@@ -0,0 +1,211 @@
+"""
+逐帧输出动画，供 `Map.animate` 使用。
+
+- `FrameWriter` 把 RGBA 帧逐帧写入 ffmpeg 的标准输入，编码成 MP4、GIF 或 APNG，或者逐帧保存为编号的图片序列。
+  已写出的帧不在内存中保留，内存占用与帧数无关。
+- `prefetch` 在后台线程中提前准备后续帧的数据（读取、平滑、计算风速），准备好的帧放入有界队列，
+  渲染与编码时下一帧的数据已经就绪。
+"""
+
+import shutil
+import subprocess
+from os import makedirs, path
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Callable, Iterable, Iterator, TypeVar
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+VIDEO_FORMATS = {
+    ".mp4": [
+        "-c:v",
+        "libx264",
+        "-pix_fmt",
+        "yuv420p",
+        "-vf",
+        "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+    ],
+    ".mov": [
+        "-c:v",
+        "libx264",
+        "-pix_fmt",
+        "yuv420p",
+        "-vf",
+        "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+    ],
+    # 每帧单独生成调色板，ffmpeg 不必缓存全部帧
+    ".gif": [
+        "-filter_complex",
+        "split[a][b];[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1",
+        "-loop",
+        "0",
+    ],
+    ".png": ["-f", "apng", "-plays", "0"],
+    ".apng": ["-f", "apng", "-plays", "0"],
+}
+"""扩展名到 ffmpeg 输出参数的映射"""
+
+
+class FrameWriter:
+    """
+    逐帧写出动画。`output` 中含有 `{}` 占位符时保存为图片序列，否则按扩展名交给 ffmpeg 编码。
+
+    ## Example:
+    ```python
+    with FrameWriter("images/500hPa.mp4", fps=4) as writer:
+        for frame in frames:
+            writer.write(frame)
+    ```
+    """
+
+    def __init__(self, output: str, fps: float = 4):
+        """
+        :param output: 输出路径，例如 `"images/500hPa.mp4"`、`"images/500hPa.gif"`，
+            或图片序列 `"images/500hPa/{:03d}.png"`
+        :param fps: 每秒帧数
+        """
+        self.output = output
+        self.fps = fps
+        self.frames = 0
+        """已写出的帧数"""
+        self.sequence = "{" in output
+        if not self.sequence:
+            extension = path.splitext(output)[1].lower()
+            if extension not in VIDEO_FORMATS:
+                raise ValueError(
+                    f"不支持的动画格式 {extension!r}，可选 {', '.join(VIDEO_FORMATS)}，"
+                    "或在路径中使用 {} 占位符输出图片序列"
+                )
+            self.codec = VIDEO_FORMATS[extension]
+            self.ffmpeg = shutil.which(matplotlib.rcParams["animation.ffmpeg_path"])
+            if self.ffmpeg is None:
+                raise RuntimeError(
+                    "未找到 ffmpeg，请先安装，或改为输出图片序列，例如 `images/{:03d}.png`"
+                )
+        self._process: subprocess.Popen | None = None
+        self._size: tuple[int, int] | None = None
+        directory = path.dirname(output.split("{")[0] if self.sequence else output)
+        if directory:
+            makedirs(directory, exist_ok=True)
+
+    def _start(self, width: int, height: int):
+        self._process = subprocess.Popen(
+            [
+                self.ffmpeg,
+                "-y",
+                "-loglevel",
+                "error",
+                "-f",
+                "rawvideo",
+                "-pix_fmt",
+                "rgba",
+                "-s",
+                f"{width}x{height}",
+                "-framerate",
+                str(self.fps),
+                "-i",
+                "-",
+                *self.codec,
+                self.output,
+            ],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def write(self, frame: np.ndarray):
+        """
+        写出一帧。
+
+        :param frame: RGBA 图像，形状为 (高, 宽, 4)，各帧尺寸须相同
+        """
+        height, width = frame.shape[:2]
+        if self._size is None:
+            self._size = (width, height)
+            if not self.sequence:
+                self._start(width, height)
+        elif self._size != (width, height):
+            raise ValueError(f"帧尺寸 {width}x{height} 与第一帧 {self._size} 不同")
+        if self.sequence:
+            plt.imsave(self.output.format(self.frames), frame)
+        else:
+            try:
+                self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+            except BrokenPipeError:
+                self.close()
+        self.frames += 1
+
+    def close(self):
+        """
+        结束写出，等待 ffmpeg 完成编码。
+        """
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        process.stdin.close()
+        error = process.stderr.read().decode(errors="replace")
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg 编码 {self.output} 失败：{error.strip()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_DONE = object()
+
+
+def prefetch(
+    fn: Callable[[T], R], items: Iterable[T], depth: int = 2
+) -> Iterator[tuple[T, R]]:
+    """
+    在后台线程中依次计算 `fn(item)`，最多提前 `depth` 项，按顺序产出 `(item, 结果)`。
+    后台线程中的异常在取到对应项时重新抛出；提前停止迭代时后台线程随之结束。
+
+    :param fn: 准备一帧数据的函数
+    :param items: 各帧的参数，例如时间
+    :param depth: 最多提前准备的帧数，决定额外占用的内存
+    """
+    queue: Queue = Queue(maxsize=max(depth, 1))
+    stop = Event()
+
+    def put(entry) -> bool:
+        # 带超时地放入，以便消费者提前退出时不会永远阻塞
+        while not stop.is_set():
+            try:
+                queue.put(entry, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def work():
+        try:
+            for item in items:
+                if not put((item, fn(item), None)):
+                    return
+        except BaseException as error:
+            put((None, None, error))
+            return
+        put(_DONE)
+
+    worker = Thread(target=work, name="prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            entry = queue.get()
+            if entry is _DONE:
+                return
+            item, result, error = entry
+            if error is not None:
+                raise error
+            yield item, result
+    finally:
+        stop.set()
+        worker.join()
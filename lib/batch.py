@@ -0,0 +1,345 @@
+"""
+多进程批量出图。
+
+`main.py` 逐个调用绘图函数，所有图在同一个进程、同一个核心上依次绘制。这里把每张图描述为一个 `Job`
+（绘图函数、参数、输出路径），交给进程池并行绘制：
+
+- 子进程使用 Agg 后端，与主进程的 pyplot 状态互不影响；主进程中修改过的 rcParams（如字体）会传给子进程。
+- 每个子进程启动时先预热：导入绘图模块，读入行政边界、Natural Earth 要素和 `preload` 中的数据集，
+  之后该进程绘制的所有图共用这些缓存。
+- 按预计耗时从大到小提交，最慢的图最先开始，避免最后只剩一张大图在单核上运行。
+  预计耗时取上次运行的实测值（保存在 `TIMINGS_PATH`），没有记录时使用 `Job.cost`。
+
+整套论文图片的耗时因此接近 总 CPU 时间 ÷ 核数。
+
+`run` 的 `exports` 为每张图追加其他格式（幻灯片用的 PNG、网页索引的缩略图等），由 `lib.export.save_all`
+与主输出一起保存，每张图只绘制一次。
+
+运行 `python -m lib.batch [进程数]` 重新生成全部论文图片。
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from os import path
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Iterable
+
+if TYPE_CHECKING:
+    from .export import Export, SaveReport
+
+current_dir = path.dirname(__file__)
+
+TIMINGS_PATH = path.join(current_dir, ".batch_timings.json")
+"""各任务上次运行耗时的记录"""
+
+
+@dataclass(frozen=True)
+class Job:
+    """
+    一张图的绘制任务。
+
+    ## Example:
+    ```python
+    from lib.draw.p4_1_to_p4_4 import draw_isobaric
+
+    Job(draw_isobaric, "images/500hPa.svg", {"h": "500", "time": "2024-04-27T05:00:00"})
+    ```
+    """
+
+    fn: Callable
+    """绘图函数，须定义在模块顶层，返回 `Map` 或 `Figure`；返回 None 时保存当前的 pyplot 图"""
+    output: str
+    """输出路径，格式由扩展名决定"""
+    kwargs: dict = field(default_factory=dict)
+    """传给 `fn` 的参数，例如时间、气压层、平滑参数"""
+    savefig: dict = field(default_factory=dict)
+    """`output` 的保存参数，同 `lib.export.save`，例如 `{"dpi": 300}`（SVG 中栅格化图层的分辨率）、
+    `{"budget": 2 * 1024**2}`、`{"rasterize": ()}`（全矢量）"""
+    cost: float = 1.0
+    """没有实测记录时的相对耗时估计，用于排序"""
+
+    @property
+    def key(self) -> str:
+        """
+        任务的标识，由函数名和参数组成，用于记录耗时。
+        """
+        arguments = ", ".join(f"{k}={v!r}" for k, v in sorted(self.kwargs.items()))
+        return f"{self.fn.__module__}.{self.fn.__qualname__}({arguments})"
+
+
+@dataclass(frozen=True)
+class JobResult:
+    """
+    任务的执行结果。
+    """
+
+    job: Job
+    seconds: float
+    """子进程中绘制并保存所用的时间"""
+    saves: "tuple[SaveReport, ...]" = ()
+    """各输出的文件大小与耗时，第一个为 `Job.output`"""
+    error: str | None = None
+    """失败时的异常信息"""
+
+
+_timings_lock = Lock()
+
+
+def load_timings(timings_path: str = TIMINGS_PATH) -> dict[str, float]:
+    """
+    读取上次运行的耗时记录，键为 `Job.key`。
+    """
+    if not path.exists(timings_path):
+        return {}
+    with open(timings_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_timings(results: Iterable[JobResult], timings_path: str = TIMINGS_PATH):
+    """
+    把成功任务的耗时合并到记录中。
+    """
+    with _timings_lock:
+        timings = load_timings(timings_path)
+        timings.update({r.job.key: r.seconds for r in results if r.error is None})
+        with open(timings_path, "w", encoding="utf-8") as f:
+            json.dump(timings, f, ensure_ascii=False, indent=2)
+
+
+def schedule(jobs: Iterable[Job], timings: dict[str, float]) -> list[Job]:
+    """
+    按预计耗时从大到小排序。
+    """
+    return sorted(jobs, key=lambda job: timings.get(job.key, job.cost), reverse=True)
+
+
+def _changed_rc() -> dict:
+    import matplotlib
+
+    return {
+        key: value
+        for key, value in matplotlib.rcParams.items()
+        if key != "backend" and value != matplotlib.rcParamsDefault.get(key)
+    }
+
+
+def _warm(rc: dict, preload: tuple[str, ...]):
+    """
+    子进程的初始化函数：切换到 Agg 后端，应用主进程的 rcParams，预先载入各图共用的数据。
+    缺少的数据在这里忽略，由用到它的任务报错。
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    matplotlib.rcParams.update(rc)
+
+    from . import boundary, data, natural_earth
+
+    try:
+        # 绘图模块依赖 metpy、wrf-python 等较重的库，导入一次即可
+        from . import draw
+    except ImportError:
+        pass
+    for name in boundary.LAYERS:
+        try:
+            boundary.layer(name)
+        except Exception:
+            pass
+    for name in natural_earth.FEATURES:
+        for scale in natural_earth.SCALES:
+            natural_earth.layer(name, scale)
+    for name in preload:
+        try:
+            getattr(data, name).resolve()
+        except Exception:
+            pass
+
+
+def outputs(job: Job, exports: "Iterable[Export]" = ()) -> "list[Export]":
+    """
+    任务的全部输出：`Job.output` 与按 `exports` 生成的其他格式。
+    `exports` 的路径中 `{stem}` 替换为去掉扩展名的 `Job.output`，`{name}` 替换为其中的文件名。
+
+    ## Example:
+    ```python
+    outputs(job, [Export("slides/{name}.png", dpi=150), Export("{stem}.thumb.jpg", width=320)])
+    ```
+    """
+    from dataclasses import replace
+
+    from .export import Export
+
+    options = dict(job.savefig)
+    options.pop("rasterize", None)
+    primary = Export(
+        job.output,
+        dpi=options.pop("dpi", None),
+        budget=options.pop("budget", None),
+        options=options,
+    )
+    stem = path.splitext(job.output)[0]
+    name = path.basename(stem)
+    return [primary] + [
+        replace(export, path=export.path.format(stem=stem, name=name))
+        for export in exports
+    ]
+
+
+def _render(job: Job, exports: "tuple[Export, ...]" = ()) -> JobResult:
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+
+    from .export import RASTER_LAYERS, save_all
+
+    start = time.perf_counter()
+    try:
+        result = job.fn(**job.kwargs)
+        targets = outputs(job, exports)
+        rasterize = job.savefig.get("rasterize", RASTER_LAYERS)
+        if hasattr(result, "save_all"):
+            # Map 只栅格化地图本身，色标保持矢量
+            reports = result.save_all(targets, rasterize=rasterize)
+        else:
+            fig = result if isinstance(result, Figure) else plt.gcf()
+            reports = save_all(fig, targets, rasterize=rasterize)
+    except Exception as e:
+        return JobResult(
+            job, time.perf_counter() - start, error=f"{type(e).__name__}: {e}"
+        )
+    finally:
+        plt.close("all")
+    return JobResult(job, time.perf_counter() - start, tuple(reports))
+
+
+def run(
+    jobs: Iterable[Job],
+    processes: int | None = None,
+    preload: Iterable[str] = (),
+    timings_path: str = TIMINGS_PATH,
+    exports: "Iterable[Export]" = (),
+) -> list[JobResult]:
+    """
+    在进程池中并行绘制 `jobs`，按完成顺序打印每张图及其各输出的耗时，返回全部结果。
+    单个任务失败不影响其他任务，失败信息见 `JobResult.error`。
+
+    :param jobs: 绘制任务
+    :param processes: 进程数，默认为 CPU 核数
+    :param preload: 每个子进程预先打开的数据集，为 `lib.data` 中的变量名，
+        例如 `("geopotential_data", "surface_data")`
+    :param timings_path: 耗时记录文件，用于下次运行时排序
+    :param exports: 每张图除 `Job.output` 外的其他输出，路径写法见 `outputs`
+
+    ## Example:
+    ```python
+    from lib.batch import run, thesis_jobs
+    from lib.export import Export
+
+    run(
+        thesis_jobs(),
+        preload=("geopotential_data", "surface_data"),
+        exports=[Export("slides/{name}.png", dpi=150), Export("web/{name}.jpg", width=480)],
+    )
+    ```
+    """
+    jobs = schedule(jobs, load_timings(timings_path))
+    exports = tuple(exports)
+    processes = min(processes or os.cpu_count() or 1, max(len(jobs), 1))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_warm,
+        initargs=(_changed_rc(), tuple(preload)),
+    ) as pool:
+        # 进程池按提交顺序取任务，因此最慢的任务最先开始
+        futures = [pool.submit(_render, job, exports) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result.error:
+                print(
+                    f"{result.seconds:>8.1f}s  {result.job.output}  失败：{result.error}"
+                )
+            else:
+                print(f"{result.seconds:>8.1f}s  {result.saves[0]}")
+                for report in result.saves[1:]:
+                    print(f"{'':>9}  {report}")
+    elapsed = time.perf_counter() - start
+    cpu = sum(r.seconds for r in results)
+    size = sum(report.bytes for r in results for report in r.saves)
+    print(
+        f"{len(results)} 张图，{processes} 个进程，耗时 {elapsed:.1f}s，"
+        f"累计 {cpu:.1f}s（{cpu / elapsed if elapsed else 0:.1f}×），"
+        f"共 {size / 1024**2:.1f} MB"
+    )
+    save_timings(results, timings_path)
+    return results
+
+
+def thesis_jobs(cross_section: bool = False) -> list[Job]:
+    """
+    论文中全部图片的绘制任务，输出路径同各绘图函数中注释掉的 `savefig`。
+    `images` 目录中目前没有图4.8（清远单站探空）。
+    `cost` 只是首次运行时的粗略估计：WRF 图需要插值，最慢；其次是需要整层积分或诊断量的 ERA5 图。
+
+    :param cross_section: 是否加上 `draw_p4_12` 的 WRF 垂直剖面图。论文中没有用到这张图，
+        `main.py` 中也没有调用，且它是最慢的一张，因此默认不绘制
+    """
+    from .draw import (
+        draw_p2_2,
+        draw_p4_5a,
+        draw_p4_5b,
+        draw_p4_6,
+        draw_p4_7l1,
+        draw_p4_7l2,
+        draw_p4_8,
+        draw_p4_9,
+        draw_p4_10,
+        draw_p4_11,
+    )
+    from .draw.p4_1_to_p4_4 import TIME, cst_title, draw_isobaric, draw_surface
+
+    jobs = [
+        Job(
+            draw_isobaric,
+            f"images/{cst_title(TIME, h + 'hPa')}.svg",
+            {"h": h},
+            cost=2,
+        )
+        for h in ("500", "700", "850")
+    ]
+    jobs += [
+        Job(draw_surface, f"images/{cst_title(TIME, '海平面')}.svg", cost=2),
+        Job(draw_p4_5a, f"images/{cst_title(TIME, '整层水汽通量')}.svg", cost=3),
+        Job(draw_p4_5b, f"images/{cst_title(TIME, '整层水汽通量散度')}.svg", cost=3),
+        Job(draw_p4_6, f"images/{cst_title(TIME, 'CAPE')}.svg", cost=2),
+        Job(draw_p4_7l1, f"images/{cst_title(TIME, '中分析图')}.svg", cost=3),
+    ]
+    jobs += [
+        Job(draw_p4_7l2, f"images/levels/{h}.svg", {"h": h})
+        for h in ("925", "850", "700", "500")
+    ]
+    jobs += [
+        Job(draw_p4_8, "images/2024-04-27 08:00:00 CST 清远单站探空数据.svg"),
+        Job(draw_p4_9, "images/2024-04-27 15:00:00 CST 广州单站探空数据.svg"),
+        Job(draw_p4_10, "images/2024-04-27 15:00:00 CST WRF 模拟数据.svg", cost=3),
+        Job(draw_p2_2, "images/wrf/wrf_dbz.svg", savefig={"dpi": 300}, cost=4),
+        Job(draw_p4_11, "images/wrf/wrf_vort.svg", cost=4),
+    ]
+    if cross_section:
+        from .draw import draw_p4_12
+
+        jobs.append(Job(draw_p4_12, "images/wrf/wrf_cross_section.svg", cost=6))
+    return jobs
+
+
+if __name__ == "__main__":
+    run(
+        thesis_jobs(),
+        int(sys.argv[1]) if len(sys.argv) > 1 else None,
+        preload=("geopotential_data", "surface_data"),
+    )
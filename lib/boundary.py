@@ -0,0 +1,375 @@
+"""
+行政区划边界的进程内缓存。
+
+每个 ChinaAdminDivisonSHP 图层在进程内只读取一次，几何对象按行政区划名称（`pr_name`、`ct_name`、`dt_name`）
+建立索引。之后每张图都直接取用已构建好的几何对象，不再重复读取和遍历 shapefile。
+
+shapefile 第一次读取后会转存为紧凑的 Parquet 文件（`STORE_DIR`），每行保存名称、外包矩形和 WKB 编码的几何对象。
+之后的进程直接读取该文件：按名称或外包矩形（R 树）找到所需的行后只解码这些几何对象，
+无关的几何对象只以字节的形式读入，不会被解码。也可以运行 `python -m lib.boundary` 预先转存全部图层。
+
+绘图时使用 `BoundaryFeature`：几何对象预先投影到地图投影，并按当前范围和分辨率下一个像素对应的长度简化，
+结果按 (投影, 容差) 缓存，大范围天气图不再为看不见的细节付出投影和栅格化的开销。
+"""
+
+import math
+import os
+from os import path
+from threading import Lock
+
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from cartopy.io import shapereader
+from matplotlib.axes import Axes
+from shapely.geometry.base import BaseGeometry
+
+current_dir = path.dirname(__file__)
+
+SHP_DIR = path.join(current_dir, "ChinaAdminDivisonSHP")
+STORE_DIR = path.join(current_dir, ".boundary_store")
+
+LAYERS = {
+    "country": "1. Country/country.shp",
+    "province": "2. Province/province.shp",
+    "city": "3. City/city.shp",
+    "district": "4. District/district.shp",
+}
+"""图层名到 shapefile 相对路径的映射"""
+
+NAME_FIELDS = ("pr_name", "ct_name", "dt_name")
+"""用于建立索引的属性字段"""
+
+BOUNDS = ("minx", "miny", "maxx", "maxy")
+
+# 简化容差对应的像素数。小于半个像素的细节在栅格化后不可见
+LOD_PIXELS = 0.5
+
+
+class BoundaryLayer:
+    """
+    一个已读入内存的图层。几何对象在第一次被取用时才从 WKB 解码。
+    """
+
+    def __init__(self, attributes: list[dict], bounds: np.ndarray, wkb: list[bytes]):
+        """
+        :param attributes: 每条记录的名称字段
+        :param bounds: 每条记录的外包矩形，形状为 (n, 4)，依次为最小经度、最小纬度、最大经度、最大纬度
+        :param wkb: 每条记录的 WKB 编码的几何对象
+        """
+        self.attributes = attributes
+        self.bounds = bounds
+        self._wkb = wkb
+        self._geometries: list[BaseGeometry | None] = [None] * len(wkb)
+        self._indexes: dict[tuple[str, ...], dict[tuple, list[int]]] = {}
+        self._tree: shapely.STRtree | None = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_shapefile(cls, shp_path: str) -> "BoundaryLayer":
+        """
+        读取 shapefile。所有几何对象都会被解码。
+        """
+        reader = shapereader.Reader(shp_path)
+        attributes, geometries = [], []
+        for record in reader.records():
+            attributes.append(
+                {k: record.attributes[k] for k in NAME_FIELDS if k in record.attributes}
+            )
+            geometries.append(record.geometry)
+        reader.close()
+        layer = cls(
+            attributes,
+            shapely.bounds(np.array(geometries, dtype=object)).reshape(-1, 4),
+            list(shapely.to_wkb(geometries)),
+        )
+        layer._geometries = geometries
+        return layer
+
+    @classmethod
+    def from_store(cls, store_path: str) -> "BoundaryLayer":
+        """
+        读取 `save` 写出的 Parquet 文件。只读取名称、外包矩形和 WKB 字节，不解码几何对象。
+        """
+        table = pq.read_table(store_path, memory_map=True)
+        fields = [f for f in NAME_FIELDS if f in table.column_names]
+        names = {f: table.column(f).to_pylist() for f in fields}
+        attributes = [{f: names[f][i] for f in fields} for i in range(table.num_rows)]
+        bounds = np.column_stack([table.column(b).to_numpy() for b in BOUNDS])
+        return cls(attributes, bounds, table.column("wkb").to_pylist())
+
+    def save(self, store_path: str):
+        """
+        将图层写为 Parquet 文件：名称字段、外包矩形和 WKB 各占一列。
+        """
+        fields = [f for f in NAME_FIELDS if any(f in a for a in self.attributes)]
+        columns = {f: [a.get(f) for a in self.attributes] for f in fields}
+        columns.update({b: self.bounds[:, i] for i, b in enumerate(BOUNDS)})
+        columns["wkb"] = pa.array(self._wkb, type=pa.binary())
+        os.makedirs(path.dirname(store_path), exist_ok=True)
+        pq.write_table(pa.table(columns), store_path + ".tmp")
+        os.replace(store_path + ".tmp", store_path)
+
+    def geometry(self, i: int) -> BaseGeometry:
+        """
+        第 `i` 条记录的几何对象，第一次取用时解码。
+        """
+        geometry = self._geometries[i]
+        if geometry is None:
+            geometry = self._geometries[i] = shapely.from_wkb(self._wkb[i])
+        return geometry
+
+    def _index(self, fields: tuple[str, ...]) -> dict[tuple, list[int]]:
+        index = self._indexes.get(fields)
+        if index is None:
+            with self._lock:
+                if fields in self._indexes:
+                    return self._indexes[fields]
+                index = {}
+                for i, attributes in enumerate(self.attributes):
+                    key = tuple(attributes.get(f) for f in fields)
+                    index.setdefault(key, []).append(i)
+                self._indexes[fields] = index
+        return index
+
+    def _intersecting(self, extent: tuple[float, float, float, float]) -> np.ndarray:
+        if self._tree is None:
+            with self._lock:
+                if self._tree is None:
+                    self._tree = shapely.STRtree(shapely.box(*self.bounds.T))
+        west, east, south, north = extent
+        return np.sort(self._tree.query(shapely.box(west, south, east, north)))
+
+    def select(
+        self, extent: tuple[float, float, float, float] | None = None, **names: str
+    ) -> list[BaseGeometry]:
+        """
+        按名称和范围选取几何对象，都不给出时返回全部。只有被选中的几何对象会被解码。
+
+        ## Example:
+        ```python
+        layer.select(ct_name="广州市", dt_name="白云区")
+        layer.select(extent=(112, 115, 22, 24))
+        ```
+
+        :param extent: 经纬度范围，依次为西、东、南、北边界，与 `GeoAxes.set_extent` 一致。
+            只返回外包矩形与之相交的几何对象
+        :param names: 按 `pr_name`、`ct_name`、`dt_name` 筛选
+        """
+        if names:
+            fields = tuple(sorted(names))
+            indices = self._index(fields).get(tuple(names[f] for f in fields), [])
+        else:
+            indices = range(len(self))
+        if extent is not None:
+            indices = np.intersect1d(indices, self._intersecting(extent))
+        return [self.geometry(int(i)) for i in indices]
+
+    def __len__(self) -> int:
+        return len(self._wkb)
+
+
+_layers: dict[str, BoundaryLayer] = {}
+_lock = Lock()
+
+
+def store_path(name: str) -> str:
+    """
+    图层 `name` 转存后的 Parquet 文件路径。
+    """
+    return path.join(STORE_DIR, name + ".parquet")
+
+
+def _load(name: str) -> BoundaryLayer:
+    shp_path = path.join(SHP_DIR, LAYERS[name])
+    store = store_path(name)
+    if path.exists(store) and (
+        not path.exists(shp_path) or path.getmtime(store) >= path.getmtime(shp_path)
+    ):
+        return BoundaryLayer.from_store(store)
+    loaded = BoundaryLayer.from_shapefile(shp_path)
+    try:
+        loaded.save(store)
+    except OSError:
+        # 目录不可写时只是失去加速，不影响绘图
+        pass
+    return loaded
+
+
+def layer(name: str) -> BoundaryLayer:
+    """
+    返回图层，首次调用时读取，之后在整个进程内复用。
+
+    :param name: 图层名，见 `LAYERS`
+    """
+    cached = _layers.get(name)
+    if cached is None:
+        with _lock:
+            cached = _layers.get(name)
+            if cached is None:
+                cached = _layers[name] = _load(name)
+    return cached
+
+
+def boundaries(
+    name: str, extent: tuple[float, float, float, float] | None = None, **names: str
+) -> list[BaseGeometry]:
+    """
+    取出图层中名称匹配的几何对象。
+
+    ## Example:
+    ```python
+    from lib.boundary import boundaries
+
+    boundaries("province", pr_name="广东省")
+    boundaries("district", ct_name="广州市", dt_name="白云区")
+    boundaries("district", extent=(112, 115, 22, 24))
+    ```
+
+    :param name: 图层名，见 `LAYERS`
+    :param extent: 经纬度范围（西、东、南、北），只返回与之相交的几何对象
+    :param names: 按 `pr_name`、`ct_name`、`dt_name` 筛选，不给出时返回全部
+    """
+    return layer(name).select(extent, **names)
+
+
+def simplification_tolerance(
+    extent: tuple[float, float, float, float], width_px: float, pixels=LOD_PIXELS
+) -> float:
+    """
+    给定范围和绘图区宽度下的简化容差，单位与 `extent` 相同。
+    容差向下取整到 2 的整数次幂，相近的范围和分辨率可以共用同一份简化结果。
+
+    :param extent: 投影坐标下的范围（x0, x1, y0, y1），例如 `ax.get_extent()`
+    :param width_px: 绘图区宽度，单位为像素
+    :param pixels: 容差对应的像素数
+    """
+    x0, x1, _, _ = extent
+    tolerance = abs(x1 - x0) / max(width_px, 1) * pixels
+    if not math.isfinite(tolerance) or tolerance <= 0:
+        return 0.0
+    return 2.0 ** math.floor(math.log2(tolerance))
+
+
+_projected: dict[tuple, list[BaseGeometry]] = {}
+_simplified: dict[tuple, list[BaseGeometry]] = {}
+
+
+def _selection_key(selections: tuple[dict, ...]) -> tuple:
+    return tuple(tuple(sorted(names.items())) for names in selections)
+
+
+def projected(
+    name: str,
+    prj: ccrs.Projection,
+    tolerance: float = 0.0,
+    selections: tuple[dict, ...] = ({},),
+) -> list[BaseGeometry]:
+    """
+    投影到 `prj` 并按 `tolerance` 简化后的几何对象，按 (图层, 筛选条件, 投影, 容差) 在进程内缓存。
+    投影只做一次，之后各容差的简化结果都从投影后的几何对象得到。
+
+    :param name: 图层名，见 `LAYERS`
+    :param prj: 目标投影
+    :param tolerance: 简化容差，单位为投影坐标单位，0 表示不简化
+    :param selections: 若干组筛选条件，结果为各组选中的几何对象之和，见 `boundaries`
+    """
+    key = (name, _selection_key(selections), prj.proj4_init)
+    full = _projected.get(key)
+    if full is None:
+        source = ccrs.PlateCarree()
+        full = []
+        for names in selections:
+            for geometry in boundaries(name, **names):
+                geometry = prj.project_geometry(geometry, source)
+                if not geometry.is_empty:
+                    full.append(geometry)
+        _projected[key] = full
+    if tolerance <= 0:
+        return full
+    simplified = _simplified.get(key + (tolerance,))
+    if simplified is None:
+        simplified = list(shapely.simplify(full, tolerance, preserve_topology=True))
+        _simplified[key + (tolerance,)] = simplified
+    return simplified
+
+
+class BoundaryFeature(cfeature.Feature):
+    """
+    按当前地图范围与分辨率简化的边界要素，几何对象已投影到地图投影，绘制时无需再投影。
+
+    ## Example:
+    ```python
+    ax.add_feature(
+        BoundaryFeature("district", ax, [{"ct_name": "广州市", "dt_name": "白云区"}]),
+        facecolor="none",
+        edgecolor="black",
+    )
+    ```
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ax: Axes,
+        selections: list[dict] | None = None,
+        pixels=LOD_PIXELS,
+        **kwargs,
+    ):
+        """
+        :param name: 图层名，见 `LAYERS`
+        :param ax: 要素所在的 GeoAxes，用于获取投影和绘图区的像素宽度
+        :param selections: 若干组筛选条件，见 `boundaries`，默认为整个图层
+        :param pixels: 简化容差对应的像素数
+        :param kwargs: 传给 `cartopy.feature.Feature` 的绘图参数
+        """
+        super().__init__(ax.projection, **kwargs)
+        self.name = name
+        self.ax = ax
+        self.selections = tuple(selections or ({},))
+        self.pixels = pixels
+
+    def geometries(self):
+        return iter(projected(self.name, self.crs, 0.0, self.selections))
+
+    def intersecting_geometries(self, extent):
+        if extent is None:
+            return self.geometries()
+        tolerance = simplification_tolerance(extent, self.ax.bbox.width, self.pixels)
+        geometries = projected(self.name, self.crs, tolerance, self.selections)
+        x0, x1, y0, y1 = extent
+        view = shapely.box(x0, y0, x1, y1)
+        return (g for g in geometries if g.intersects(view))
+
+
+def build_stores(names=LAYERS) -> list[str]:
+    """
+    将图层从 shapefile 转存为 Parquet 文件，返回写出的文件路径。
+
+    :param names: 需要转存的图层名，默认为全部图层
+    """
+    written = []
+    for name in names:
+        BoundaryLayer.from_shapefile(path.join(SHP_DIR, LAYERS[name])).save(
+            store_path(name)
+        )
+        written.append(store_path(name))
+    return written
+
+
+def clear_cache():
+    """
+    丢弃已读取的图层，下次使用时重新读取。
+    """
+    with _lock:
+        _layers.clear()
+        _projected.clear()
+        _simplified.clear()
+
+
+if __name__ == "__main__":
+    for written in build_stores():
+        print(f"{written}: {path.getsize(written) / 1048576:.1f} MiB")
@@ -1,53 +1,253 @@
+import os
 from os import path
+from threading import RLock
+from typing import Callable
 import numpy as np
 import xarray
 from matplotlib.colors import ListedColormap
-from .era5 import (
-    download_single_level_data,
-    download_geopotential_data,
-    download_single_station_data,
+
+current_dir = path.dirname(__file__)
+
+
+class LazyDataset:
+    """
+    延迟加载的数据集代理。首次访问属性（如 `.sel`、`["msl"]`）时才打开文件，
+    文件不存在时才触发下载，因此只画 WRF 图或探空图时不会碰到无关的 ERA5 数据。
+    """
+
+    def __init__(self, name: str, loader: Callable[[], xarray.Dataset]):
+        """
+        :param name: 数据集名称，仅用于显示
+        :param loader: 打开（必要时下载）数据集的函数，只会被调用一次
+        """
+        self._name = name
+        self._loader = loader
+        self._dataset: xarray.Dataset | None = None
+        self._lock = RLock()
+
+    @property
+    def loaded(self) -> bool:
+        """数据集是否已经打开"""
+        return self._dataset is not None
+
+    def resolve(self) -> xarray.Dataset:
+        """
+        返回实际的 xarray Dataset，第一次调用时打开文件。
+        """
+        if self._dataset is None:
+            with self._lock:
+                if self._dataset is None:
+                    self._dataset = self._loader()
+        return self._dataset
+
+    def reset(self):
+        """
+        关闭并丢弃已打开的数据集，下次访问时重新加载。
+        """
+        with self._lock:
+            if self._dataset is not None:
+                self._dataset.close()
+            self._dataset = None
+
+    def __getattr__(self, name: str):
+        # 只有在实例本身找不到属性时才会进入这里
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+    def __setitem__(self, key, value):
+        self.resolve()[key] = value
+
+    def __contains__(self, key) -> bool:
+        return key in self.resolve()
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self) -> int:
+        return len(self.resolve())
+
+    def __repr__(self) -> str:
+        if self._dataset is None:
+            return f"<LazyDataset {self._name} (not loaded)>"
+        return repr(self._dataset)
+
+
+# 工作存储的分块方式：每个时次（和每个气压层）一块，经纬度方向不切分，
+# 这样画一个时次只需读一块，而高斯平滑等空间操作也不会跨块
+STORE_CHUNKS = {
+    "surface": {"valid_time": 1},
+    "geopotential": {"valid_time": 1, "pressure_level": 1},
+    "single_station": {"valid_time": 1},
+}
+
+# 这些编码项描述的是源文件的存储布局，转写时需要丢弃，否则会与新的分块冲突
+_LAYOUT_ENCODINGS = (
+    "chunksizes",
+    "contiguous",
+    "original_shape",
+    "preferred_chunks",
+    "source",
+    "zlib",
+    "complevel",
+    "compression",
+    "shuffle",
+    "fletcher32",
 )
-import zipfile
 
 
-current_dir = path.dirname(__file__)
+def store_path(source: str) -> str:
+    """
+    源文件对应的分块工作存储路径，例如 `surface.nc` 对应 `surface.chunked.nc`。
+    """
+    root, ext = path.splitext(source)
+    return f"{root}.chunked{ext}"
+
+
+def build_store(source: str, chunks: dict[str, int]) -> str:
+    """
+    将 ERA5 NetCDF 文件转写为按 `chunks` 分块的工作存储，返回存储路径。
+    转写通过 dask 逐块进行，内存占用与文件大小无关。
+
+    :param source: ERA5 NetCDF 文件路径
+    :param chunks: 维度名到块大小的映射，未列出的维度整体作为一块
+    """
+    store = store_path(source)
+    tmp = store + ".tmp"
+    with xarray.open_dataset(source, chunks=chunks) as ds:
+        encoding = {}
+        for name, variable in ds.variables.items():
+            for key in _LAYOUT_ENCODINGS:
+                variable.encoding.pop(key, None)
+            if name in ds.data_vars and variable.dims:
+                encoding[name] = {
+                    "chunksizes": tuple(
+                        min(chunks.get(dim, ds.sizes[dim]), ds.sizes[dim])
+                        for dim in variable.dims
+                    ),
+                }
+        ds.to_netcdf(tmp, encoding=encoding)
+    os.replace(tmp, store)
+    return store
+
+
+def open_store(source: str, chunks: dict[str, int]) -> xarray.Dataset:
+    """
+    以 dask 分块方式打开源文件对应的工作存储。工作存储不存在或比源文件旧时先进行一次转写。
+
+    :param source: ERA5 NetCDF 文件路径
+    :param chunks: 维度名到块大小的映射
+    """
+    if not path.exists(source):
+        raise FileNotFoundError(source)
+    store = store_path(source)
+    if not path.exists(store) or path.getmtime(store) < path.getmtime(source):
+        print(f"Converting {path.basename(source)} to chunked working store...")
+        build_store(source, chunks)
+    return xarray.open_dataset(store, chunks=chunks)
+
+
+# 单位换算后的派生变量：名称 -> (源变量, 除数, 单位)
+DERIVED_VARIABLES = {
+    "msl_hpa": ("msl", 100, "hPa"),
+    "z_dagpm": ("z", 98.1, "dagpm"),
+}
+
+
+def with_derived(ds: xarray.Dataset) -> xarray.Dataset:
+    """
+    为数据集添加 `DERIVED_VARIABLES` 中的派生变量，源变量保持不变。
+    派生变量是 dask 上的惰性视图，只有被选中并计算的那一块才会进行换算。
+
+    :param ds: 包含源变量的数据集
+    """
+    derived = {}
+    for name, (source, divisor, units) in DERIVED_VARIABLES.items():
+        if source in ds.data_vars:
+            variable = ds[source] / divisor
+            variable.attrs = {**ds[source].attrs, "units": units}
+            derived[name] = variable
+    return ds.assign(derived)
+
+
+def _downloaded(target: str) -> bool:
+    """
+    检查下载文件是否可用：文件存在，且与下载清单中记录的大小和修改时间一致。
+    与清单不符（例如下载中断留下的残缺文件）时删除该文件。不读取文件内容。
+    """
+    if not path.exists(target):
+        return False
+    from .era5.manifest import Manifest
+
+    if Manifest(current_dir).validate(target, missing_ok=True):
+        return True
+    print(f"{path.basename(target)} does not match the download manifest, removing...")
+    os.remove(target)
+    return False
+
+
+def _open_surface_data() -> xarray.Dataset:
+    archive = path.join(current_dir, "surface.zip")
+    source = path.join(current_dir, "surface.nc")
+    if path.exists(source) and (
+        not path.exists(archive) or path.getmtime(archive) <= path.getmtime(source)
+    ):
+        # surface.nc 比压缩包新，无需重新解压
+        return with_derived(open_store(source, STORE_CHUNKS["surface"]))
+
+    if not _downloaded(archive):
+        from .era5 import download_single_level_data
 
-try:
-    surface_data = xarray.open_dataset(path.join(current_dir, "surface.nc"))
-except FileNotFoundError:
-    if not path.exists(path.join(current_dir, "surface.zip")):
         print("Single level data not found, attempt downloading...")
         download_single_level_data()
+    from .era5.archive import extract_member
+
     print("Extracting single level data from zip file...")
-    with zipfile.ZipFile(path.join(current_dir, "surface.zip"), "r") as zip_ref:
-        with (
-            zip_ref.open("data_stream-oper_stepType-instant.nc") as source,
-            open(path.join(current_dir, "surface.nc"), "wb") as target,
-        ):
-            target.write(source.read())
-    surface_data = xarray.open_dataset(path.join(current_dir, "surface.nc"))
-
-surface_data["msl"] /= 100
-
-try:
-    geopotential_data = xarray.open_dataset(path.join(current_dir, "geopotential.nc"))
-except FileNotFoundError:
-    print("Geopotential data not found, attempt downloading...")
-    download_geopotential_data()
-    geopotential_data = xarray.open_dataset(path.join(current_dir, "geopotential.nc"))
-
-geopotential_data["z"] /= 98.1
-
-try:
-    single_station_data = xarray.open_dataset(
-        path.join(current_dir, "single_station.nc")
-    )
-except FileNotFoundError:
-    print("Single station data not found, attempt downloading...")
-    download_single_station_data()
-    single_station_data = xarray.open_dataset(
-        path.join(current_dir, "single_station.nc")
-    )
+    extract_member(archive, "data_stream-oper_stepType-instant.nc", source)
+    return with_derived(open_store(source, STORE_CHUNKS["surface"]))
+
+
+def _open_geopotential_data() -> xarray.Dataset:
+    source = path.join(current_dir, "geopotential.nc")
+    if not _downloaded(source):
+        from .era5 import download_geopotential_data
+
+        print("Geopotential data not found, attempt downloading...")
+        download_geopotential_data()
+    return with_derived(open_store(source, STORE_CHUNKS["geopotential"]))
+
+
+def _open_single_station_data() -> xarray.Dataset:
+    source = path.join(current_dir, "single_station.nc")
+    if not _downloaded(source):
+        from .era5 import download_single_station_data
+
+        print("Single station data not found, attempt downloading...")
+        download_single_station_data()
+    return open_store(source, STORE_CHUNKS["single_station"])
+
+
+def _open_sounding_data():
+    from glob import glob
+    from .sounding import SoundingStore
+
+    files = sorted(glob(path.join(current_dir, "UPPER_AIR/TLOGP/*.000")))
+    if not files:
+        raise Exception(
+            "未找到 NMC 单站探空数据，请先下载并解压缩到 lib/UPPER_AIR 目录下\n"
+            + "该数据并不公开提供获取，且作者受协议限制，无法提供"
+        )
+    return SoundingStore.from_files(files)
+
+
+surface_data = LazyDataset("surface", _open_surface_data)
+geopotential_data = LazyDataset("geopotential", _open_geopotential_data)
+single_station_data = LazyDataset("single_station", _open_single_station_data)
+sounding_data = LazyDataset("sounding", _open_sounding_data)
+"""MICAPS TLOGP 探空资料，`lib.sounding.SoundingStore`"""
 
 radar_colors = [
     "#04e9e7",
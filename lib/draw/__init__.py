@@ -1,5 +1,12 @@
 from .p2_2_and_p4_11_to_p4_12 import draw_p2_2, draw_p4_11, draw_p4_12
-from .p4_1_to_p4_4 import draw_p4_1, draw_p4_2, draw_p4_3, draw_p4_4
+from .p4_1_to_p4_4 import (
+    draw_isobaric,
+    draw_surface,
+    draw_p4_1,
+    draw_p4_2,
+    draw_p4_3,
+    draw_p4_4,
+)
 from .p4_5_to_p4_7 import draw_p4_5a, draw_p4_5b, draw_p4_6, draw_p4_7l1, draw_p4_7l2
 from .p4_8_to_p4_10 import draw_p4_8, draw_p4_9, draw_p4_10
 
@@ -14,6 +14,7 @@ from wrf import (
 )
 import cartopy.crs as ccrs
 from lib import Map, radar_cmap, radar_levels
+from lib.mesh import projected_grid
 from scipy.ndimage import gaussian_filter
 import numpy as np
 from matplotlib import pyplot as plt
@@ -40,15 +41,16 @@ def draw_p2_2():
         location_color="red",
     ).common()
 
+    grid = map.projected(to_np(lons), to_np(lats))
     ctp = map.ax.contourf(
-        to_np(lons),
-        to_np(lats),
+        grid.x,
+        grid.y,
         to_np(dbz_300),
         vmin=0,
         vmax=65,
         # add_labels=False,
         levels=radar_levels,
-        transform=ccrs.PlateCarree(),
+        transform=map.proj,
         cmap=radar_cmap,
         extend="both",
     )
@@ -61,6 +63,7 @@ def draw_p2_2():
     map.ax.legend(loc="lower right")
     map.title("WRF 2024-04-27 15:00:00 离地 300m 反射率 (dBZ)", fontsize=20)
     # map.fig.savefig("./images/wrf/wrf_dbz.svg", dpi=300)
+    return map
 
 
 def draw_p4_11():
@@ -79,13 +82,14 @@ def draw_p4_11():
 
     avo_500_filtered = gaussian_filter(avo_500, sigma=5)
 
+    grid = map.projected(to_np(lons), to_np(lats))
     ctp = map.ax.contourf(
-        to_np(lons),
-        to_np(lats),
+        grid.x,
+        grid.y,
         to_np(avo_500_filtered),
         extend="max",
         levels=np.arange(800, 1200, 100),
-        transform=ccrs.PlateCarree(),
+        transform=map.proj,
         linewidths=1.5,
     )
     map.fig.colorbar(
@@ -125,6 +129,7 @@ def draw_p4_11():
     )
     map.ax.legend(loc="lower right")
     # map.fig.savefig("./images/wrf/wrf_vort.svg")
+    return map
 
 
 def draw_p4_12():
@@ -190,13 +195,14 @@ def draw_p4_12():
 
     # Create the filled cloud top temperature contours
     # contour_levels = [-80.0, -70.0, -60, -50, -40, -30, -20, -10, 0, 10]
+    grid = projected_grid(to_np(lons), to_np(lats), cart_proj)
     ctt_contours = ax_ctt.contourf(
-        to_np(lons),
-        to_np(lats),
+        grid.x,
+        grid.y,
         to_np(ctt),
         # contour_levels,
         cmap=radar_cmap,
-        transform=ccrs.PlateCarree(),
+        transform=cart_proj,
         extend="both",
         zorder=2,
         levels=radar_levels,
@@ -278,3 +284,4 @@ def draw_p4_12():
     #     "./images/wrf/wrf_cross_section.svg",
     #     # dpi=300,
     # )
+    return fig
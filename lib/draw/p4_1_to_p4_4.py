@@ -2,61 +2,87 @@
 图 4.1 至 4.4，ERA5 大尺度形势图
 """
 
+import pandas as pd
+
 from ..map import Map
 from ..data import geopotential_data, surface_data
 
+TIME = "2024-04-27T05:00:00"
+"""论文中使用的时次（UTC），即北京时 13 时"""
 
-def draw_p4_1():
+
+def cst_title(time: str, product: str) -> str:
     """
-    图4.1，500hPa 大尺度形势图
+    以北京时表示的图题，例如 `"2024-04-27 13:00:00 CST 500hPa"`。
+
+    :param time: UTC 时间字符串
+    :param product: 图的内容，例如气压层 `"500hPa"` 或 `"海平面"`
+    """
+    cst = pd.Timestamp(time) + pd.Timedelta(hours=8)
+    return f"{cst:%Y-%m-%d %H:%M:%S} CST {product}"
+
+
+def draw_isobaric(h: str, time: str = TIME, sigma=5, sigmaT=5):
+    """
+    等压面大尺度形势图，图 4.1 至 4.3 均由此绘制。
+
+    :param h: 气压层，例如 `"500"`
+    :param time: UTC 时间字符串
+    :param sigma: 高度场平滑参数
+    :param sigmaT: 温度场平滑参数
     """
-    title = "2024-04-27 13:00:00 CST 500hPa"
+    title = cst_title(time, f"{h}hPa")
     map = (
         Map(geopotential_data, location_color="blue")
         .common()
-        .plot("2024-04-27T05:00:00", "500", sigmaT=5, sigma=5)
+        .plot(time, h, sigmaT=sigmaT, sigma=sigma)
         .title(title, fontsize=20)
     )
     # map.fig.savefig(f"images/{title}.svg")
+    return map
 
 
-def draw_p4_2():
+def draw_surface(time: str = TIME, sigma=5):
     """
-    图4.2，700hPa 大尺度形势图
+    海平面大尺度形势图，图 4.4 由此绘制。
+
+    :param time: UTC 时间字符串
+    :param sigma: 海平面气压平滑参数
     """
-    title = "2024-04-27 13:00:00 CST 700hPa"
+    title = cst_title(time, "海平面")
     map = (
-        Map(geopotential_data, location_color="blue")
+        Map(surface_data, location_color="red")
         .common()
-        .plot("2024-04-27T05:00:00", "700", sigmaT=5, sigma=5)
+        .plot(time, sigma=sigma)
         .title(title, fontsize=20)
     )
     # map.fig.savefig(f"images/{title}.svg")
+    return map
+
+
+def draw_p4_1():
+    """
+    图4.1，500hPa 大尺度形势图
+    """
+    return draw_isobaric("500")
+
+
+def draw_p4_2():
+    """
+    图4.2，700hPa 大尺度形势图
+    """
+    return draw_isobaric("700")
 
 
 def draw_p4_3():
     """
     图4.3，850hPa 大尺度形势图
     """
-    title = "2024-04-27 13:00:00 CST 850hPa"
-    map = (
-        Map(geopotential_data, location_color="blue")
-        .common()
-        .plot("2024-04-27T05:00:00", "850", sigmaT=5, sigma=5)
-        .title(title, fontsize=20)
-    )
-    # map.fig.savefig(f"images/{title}.svg")
+    return draw_isobaric("850")
 
 
 def draw_p4_4():
     """
     图4.4，海平面大尺度形势图
     """
-    title = "2024-04-27 13:00:00 CST 海平面"
-    map = (
-        Map(surface_data, location_color="red")
-        .common()
-        .plot("2024-04-27T05:00:00", sigma=5)
-        .title(title, fontsize=20)
-    )
-    # map.fig.savefig(f"images/{title}.svg")
+    return draw_surface()
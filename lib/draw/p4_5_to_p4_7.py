@@ -7,10 +7,19 @@ from lib import Map, surface_data, geopotential_data
 import numpy as np
 import cartopy.crs as ccrs
 from matplotlib import patheffects
-from scipy.ndimage import gaussian_filter
 from metpy.calc import dewpoint_from_specific_humidity, divergence
 from metpy.units import units
 
+from ..region import crop
+from ..smooth import smoothed
+
+SOUTH_CHINA = (105, 121, 20, 28)
+"""华南地区图的范围（西、东、南、北）"""
+
+SOUTH_CHINA_GRID = (105, 120.75, 20, 27.75)
+"""图4.6 与图4.7 第一层所画数据的范围，比 `SOUTH_CHINA` 少东、北两端的格点。
+这两张图不指定地图范围，图幅由数据范围决定"""
+
 
 def draw_p4_5a():
     """
@@ -21,8 +30,12 @@ def draw_p4_5a():
         prj=ccrs.PlateCarree(),
     )
     map.common()
-    pl = map.data.sel(
-        valid_time="2024-04-27T05:00:00",
+    pl = (
+        map.data[["viwve", "viwvn"]]
+        .sel(
+            valid_time="2024-04-27T05:00:00",
+        )
+        .load()
     )
     viw = (pl["viwve"] ** 2 + pl["viwvn"] ** 2) ** 0.5
     viw.plot.contourf(
@@ -34,20 +47,16 @@ def draw_p4_5a():
             "label": "水汽通量 [$\mathrm{kg \cdot m^{-1}\cdot s^{-1}}$]",
         },
     )
-    plb = pl.sel(
-        longitude=slice(None, None, 15),
-        latitude=slice(None, None, 15),
-    )
-    quiver = plb.plot.quiver(
-        "longitude",
-        "latitude",
-        "viwve",
-        "viwvn",
+    plb = map.thin(pl)
+    quiver = map.ax.quiver(
+        plb["longitude"].values,
+        plb["latitude"].values,
+        plb["viwve"].values,
+        plb["viwvn"].values,
         scale=5000,
         color="black",
         width=0.002,
         headlength=4,
-        add_guide=False,
     )
     qk = map.ax.quiverkey(
         quiver,
@@ -63,6 +72,7 @@ def draw_p4_5a():
     title = "2024-04-27 13:00:00 CST 整层水汽通量"
     map.title(title, fontsize=20)
     # map.fig.savefig(f"images/{title}.svg")
+    return map
 
 
 def draw_p4_5b():
@@ -74,8 +84,12 @@ def draw_p4_5b():
         prj=ccrs.PlateCarree(),
     )
     map.common()
-    pl = map.data.sel(
-        valid_time="2024-04-27T05:00:00",
+    pl = (
+        map.data[["viwve", "viwvn"]]
+        .sel(
+            valid_time="2024-04-27T05:00:00",
+        )
+        .load()
     )
     viw_div = divergence(pl["viwve"], pl["viwvn"])
     viw_div.plot.contourf(
@@ -90,6 +104,7 @@ def draw_p4_5b():
     title = "2024-04-27 13:00:00 CST 整层水汽通量散度"
     map.title(title, fontsize=20)
     # map.fig.savefig(f"images/{title}.svg")
+    return map
 
 
 def draw_p4_6():
@@ -97,20 +112,17 @@ def draw_p4_6():
     图4.6，华南地区整层 CAPE 形势
     """
     map = Map(surface_data).common()
-    map.data["cape"].sel(
-        valid_time="2024-04-27T05:00:00",
-        longitude=np.arange(105, 121, 0.25),
-        latitude=np.arange(20, 28, 0.25),
-    ).plot.contourf(
+    cape = crop(map.data, SOUTH_CHINA_GRID)["cape"].sel(
+        valid_time="2024-04-27T05:00:00"
+    )
+    map.contourf(
+        cape,
         extend="max",
         levels=np.arange(1000, 5101, 250),
         cmap="YlOrBr",
         cbar_kwargs={"location": "bottom", "label": "CAPE"},
         vmin=1000,
         # vmax=100,
-        add_labels=False,
-        ax=map.ax,
-        transform=ccrs.PlateCarree(),
         # add_colorbar=False,)
     )
     map.draw_tornado_location()
@@ -118,6 +130,7 @@ def draw_p4_6():
     title = "2024-04-27 13:00:00 CST CAPE"
     map.title(title, fontsize=20)
     # map.fig.savefig(f"images/{title}.svg")
+    return map
 
 
 def draw_p4_7l1():
@@ -129,50 +142,42 @@ def draw_p4_7l1():
     本函数绘制 500hPa 干区与 925hPa 湿区
     """
     map = Map(
-        geopotential_data.sel(
-            valid_time="2024-04-27T05:00:00",
-            longitude=np.arange(105, 121, 0.25),
-            latitude=np.arange(20, 28, 0.25),
-        ),
+        # 多留出平滑（sigma=2）所需的边缘
+        crop(geopotential_data, SOUTH_CHINA_GRID, sigma=2)
+        .sel(valid_time="2024-04-27T05:00:00")
+        .load(),
         prj=ccrs.LambertConformal(central_longitude=112, central_latitude=35),
         location_color="red",
     ).common()
-    data925 = map.data.sel(pressure_level="925")
-    t925 = data925["t"]
-    td925 = dewpoint_from_specific_humidity(
-        925 * units.hPa, specific_humidity=data925["q"]
-    )
-    t_td925 = t925 * units.K - td925
-    data500 = map.data.sel(pressure_level="500")
-    t500 = data500["t"]
-    td500 = dewpoint_from_specific_humidity(
-        500 * units.hPa, specific_humidity=data500["q"]
-    )
-    t_td500 = t500 * units.K - td500
-
-    t_td925.values = gaussian_filter(t_td925.values, 2)
-    ct = t_td925.plot.contour(
+    # 两层的温度露点差一起计算、一起平滑
+    data = map.data.sel(pressure_level=["925", "500"])
+    td = dewpoint_from_specific_humidity(
+        data["pressure_level"].astype(float) * units.hPa,
+        specific_humidity=data["q"],
+    )
+    t_td = smoothed((data["t"] * units.K - td).metpy.dequantify().rename("t_td"), 2)
+    # 平滑后去掉多留的边缘
+    t_td = crop(t_td, SOUTH_CHINA_GRID)
+    t_td925 = t_td.sel(pressure_level="925")
+    t_td500 = t_td.sel(pressure_level="500")
+
+    ct = map.contour(
+        t_td925,
         extend="max",
         levels=[5],
         colors="green",
         vmax=5,
-        add_labels=False,
-        ax=map.ax,
-        transform=ccrs.PlateCarree(),
     )
     ct.set(
         path_effects=[patheffects.withTickedStroke(angle=-90, length=0.5, spacing=20)]
     )
     map.ax.clabel(ct)
-    t_td500.values = gaussian_filter(t_td500.values, 2)
-    ct = t_td500.plot.contour(
+    ct = map.contour(
+        t_td500,
         extend="max",
         levels=[15],
         colors="gold",
         vmax=15,
-        add_labels=False,
-        ax=map.ax,
-        transform=ccrs.PlateCarree(),
         # add_colorbar=False,))
     )
     ct.set(
@@ -183,6 +188,7 @@ def draw_p4_7l1():
     title = "2024-04-27 13:00:00 CST 中分析图"
     map.title(title, fontsize=20)
     # map.fig.savefig(f"images/{title}.svg")
+    return map
 
 
 def draw_p4_7l2(h: Literal["925", "850", "700", "500"]):
@@ -195,36 +201,27 @@ def draw_p4_7l2(h: Literal["925", "850", "700", "500"]):
     """
 
     map = Map(
-        geopotential_data.sel(
-            valid_time="2024-04-27T05:00:00",
-            longitude=np.arange(105, 121, 0.25),
-            latitude=np.arange(20, 28, 0.25),
-        ),
+        # 多留出平滑（sigma=2）所需的边缘
+        crop(geopotential_data, SOUTH_CHINA, sigma=2)
+        .sel(valid_time="2024-04-27T05:00:00")
+        .load(),
         prj=ccrs.LambertConformal(central_longitude=112, central_latitude=35),
         location_color="red",
+        extent=SOUTH_CHINA,
     ).common()
-    map.ax.set_extent([105, 121, 20, 28])
-    datab = map.data.sel(pressure_level=h)
-    z = datab["z"]
-    z.values = gaussian_filter(z.values, 2)
-    ct = z.plot.contour(
+    # 平滑全部气压层并缓存，绘制其他层时直接选取
+    z = smoothed(map.data["z_dagpm"], 2).sel(pressure_level=h)
+    ct = map.contour(
+        z,
         levels=np.arange(0, 1000, 4),
         linewidths=1.5,
-        transform=ccrs.PlateCarree(),
         colors="black",
-        ax=map.ax,
     )
     map.ax.clabel(ct, inline=True, fontsize=10, fmt="%1.0f")
-    datab = map.data.sel(pressure_level=h)
-    map.ax.streamplot(
-        x=datab.longitude.values,
-        y=datab.latitude.values,
-        u=datab.u.values,
-        v=datab.v.values,
-        transform=ccrs.PlateCarree(),
-    )
+    map.streamplot(map.data.sel(pressure_level=h), "u", "v")
 
     map.draw_tornado_location(add_legend=True)
 
     map.title(h, fontsize=20)
     # map.fig.savefig(f"images/levels/{h}.svg")
+    return map
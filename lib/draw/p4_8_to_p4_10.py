@@ -532,6 +532,7 @@ def draw(
     # plt.savefig("images/2024-04-27 08:00:00 CST 清远单站探空数据.svg")
     # plt.savefig("images/2024-04-27 15:00:00 CST 广州单站探空数据.svg")
     # plt.savefig("images/2024-04-27 15:00:00 CST WRF 模拟数据.svg")
+    return fig
 
 
 from os import path
@@ -545,25 +546,17 @@ def nmc_preprocess() -> (
     """
     MICAPS 探空资料读取与预处理
     """
-    data_path = path.join(current_dir, "../UPPER_AIR")
-    if not path.exists(data_path):
-        raise Exception(
-            "未找到 NMC 单站探空数据，请先下载并解压缩到 lib/UPPER_AIR 目录下\n"
-            + "该数据并不公开提供获取，且作者受协议限制，无法提供"
-        )
-    from nmc_met_io.read_micaps import read_micaps_5
-    import pandas as pd
-
-    data: pd.DataFrame = read_micaps_5(path.join(data_path, "TLOGP/20240427080000.000"))
-    # select ID=59280
-    df = data[data["ID"] == "59280"][data["height"] < 1200]
-
-    p = df["pressure"].values * units.hPa
-    z = df["height"].values * units.m * 10
-    T = df["temperature"].values * units.degC
-    Td = df["dewpoint"].values * units.degC
-    wind_speed = df["wind_speed"].values * units.meter_per_second
-    wind_dir = df["wind_angle"].values * units.degrees
+    from ..data import sounding_data
+
+    profile = sounding_data.profile("59280", "2024-04-27 08:00")
+    below = profile.height < 1200
+
+    p = profile.pressure[below] * units.hPa
+    z = profile.height[below] * units.m * 10
+    T = profile.temperature[below] * units.degC
+    Td = profile.dewpoint[below] * units.degC
+    wind_speed = profile.wind_speed[below] * units.meter_per_second
+    wind_dir = profile.wind_angle[below] * units.degrees
     u, v = mpcalc.wind_components(wind_speed, wind_dir)
     return T, p, Td, u, v, z
 
@@ -576,10 +569,11 @@ def era5_preprocess() -> (
     """
     from ..data import single_station_data
 
-    df = single_station_data.sel(
-        latitude=23.1,
-        longitude=113.45,
-        valid_time="2024-04-27T07:00:00",
+    # 单站区域已对齐到 ERA5 格点，取离站点最近的格点
+    df = (
+        single_station_data.sel(valid_time="2024-04-27T07:00:00")
+        .sel(latitude=23.1, longitude=113.45, method="nearest")
+        .load()
     )
     Td = mpcalc.dewpoint_from_specific_humidity(
         df["pressure_level"].values * units.hPa,
@@ -633,7 +627,7 @@ def draw_p4_8():
     图4.8，2024 年 4 月 27 日 08 时清远站（编号 59280，23.72°N，113.08°E）实测探空数据 T-lnP 图与风矢图
     """
     T, p, Td, u, v, z = nmc_preprocess()
-    draw(
+    return draw(
         T=T,
         p=p,
         Td=Td,
@@ -650,7 +644,7 @@ def draw_p4_9():
     图4.9，2024 年 4 月 27 日 15 时再分析资料广州站邻近格点数据 T-lnP 图与风矢图
     """
     T, p, Td, u, v, z = era5_preprocess()
-    draw(
+    return draw(
         T=T,
         p=p,
         Td=Td,
@@ -667,7 +661,7 @@ def draw_p4_10():
     图4.10，2024 年 4 月 27 日 15 时龙卷发生地 WRF 模式邻近格点数据 T-lnP 图与风矢图
     """
     T, p, Td, u, v, z = wrf_preprocess()
-    draw(
+    return draw(
         T=T,
         p=p,
         Td=Td,
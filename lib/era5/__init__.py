@@ -4,6 +4,15 @@
 - `download_geopotential_data`: 下载各等压面大尺度数据
 - `download_single_station_data`: 下载单站数据
 
+大请求会按日期、变量组切分为若干分片，并发下载后合并为同一个输出文件，
+并发数可通过 `max_workers` 参数调整。输出文件已存在时，只下载请求中文件尚未覆盖的变量、时次和气压层，
+再合并进已有文件，因此扩展日期范围只需下载新增的部分。
+
+请求由 `lib.era5.case.CaseConfig` 个例配置生成，论文个例为 `THESIS_CASE`。研究新的个例时，
+新建一个 `CaseConfig` 并调用其 `fetch_all` 方法即可；多个个例可用 `fetch_cases` 批量获取，
+磁盘上已有的覆盖范围更大的数据会被直接截取复用。`lib.era5.local_client.LocalClient` 是 CDS 客户端的本地替身，
+可通过 `client_factory` 参数传入，用于离线测试与评测。
+
 在使用这些函数之前，请确保已安装`cdsapi`库，并正确[配置了CDS API密钥](https://cds.climate.copernicus.eu/how-to-api)。
 """
 
@@ -0,0 +1,88 @@
+import mmap
+import os
+import struct
+import zipfile
+from contextlib import contextmanager
+from typing import Iterator
+
+# 每次从压缩包中读出的字节数，决定了解压时的峰值内存
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def extract_member(
+    archive: str,
+    member: str,
+    target: str,
+    chunk_size: int = CHUNK_SIZE,
+    progress: bool = True,
+) -> str:
+    """
+    将 zip 压缩包中的单个文件分块解压到 `target`，峰值内存只与 `chunk_size` 有关。
+    解压先写入临时文件，完成后再原子地重命名，中途失败不会留下残缺的目标文件。
+
+    :param archive: zip 压缩包路径
+    :param member: 压缩包内的文件名，例如 `"data_stream-oper_stepType-instant.nc"`
+    :param target: 解压目标路径
+    :param chunk_size: 每次读取的字节数，默认为 16MiB
+    :param progress: 是否打印解压进度
+    """
+    tmp = target + ".tmp"
+    with zipfile.ZipFile(archive, "r") as zip_ref:
+        total = zip_ref.getinfo(member).file_size
+        done = 0
+        last_percent = -1
+        try:
+            with zip_ref.open(member) as source, open(tmp, "wb") as dest:
+                while chunk := source.read(chunk_size):
+                    dest.write(chunk)
+                    done += len(chunk)
+                    percent = done * 100 // total if total else 100
+                    if progress and percent != last_percent:
+                        print(
+                            f"\rExtracting {member}: {percent:3d}% "
+                            f"({done / 1048576:.1f}/{total / 1048576:.1f} MiB)",
+                            end="",
+                            flush=True,
+                        )
+                        last_percent = percent
+        except BaseException:
+            # 磁盘写满、压缩包损坏或被中断时，不留下残缺的临时文件
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            if progress:
+                print()
+    os.replace(tmp, target)
+    return target
+
+
+@contextmanager
+def stored_member(mapped: mmap.mmap, info: zipfile.ZipInfo) -> Iterator[memoryview]:
+    """
+    内存映射的压缩包中一个未压缩（`ZIP_STORED`）成员的字节，不解压也不复制，只有被访问的页会从磁盘读入。
+    退出时释放视图，之后才能关闭 `mapped`。
+
+    ## Example:
+    ```python
+    with open("surface.zip", "rb") as f, zipfile.ZipFile(f) as z:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with stored_member(mapped, z.getinfo("data_stream-oper_stepType-instant.nc")) as data:
+                nc = netCDF4.Dataset("instant.nc", memory=data)
+    ```
+
+    :param mapped: 整个压缩包的只读内存映射
+    :param info: 成员的信息，压缩方式须为 `ZIP_STORED`
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{info.filename} 经过压缩，无法直接映射")
+    # 本地文件头：30 字节的定长部分，其后是文件名和扩展字段，长度与中央目录中的记录不一定相同
+    name_length, extra_length = struct.unpack_from(
+        "<HH", mapped, info.header_offset + 26
+    )
+    start = info.header_offset + 30 + name_length + extra_length
+    view = memoryview(mapped)[start : start + info.file_size]
+    try:
+        yield view
+    finally:
+        view.release()
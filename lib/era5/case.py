@@ -0,0 +1,500 @@
+"""
+个例配置：用日期、区域、气压层和变量描述一次个例研究，并由此生成单层、等压面大尺度与单站三类 CDS 请求。
+
+获取数据时：
+- 单站请求中能从大尺度等压面数据直接截取的气压层不再单独下载；
+- 磁盘上已有覆盖所需范围的文件（包括其他个例下载的文件）时，直接从中截取，不再下载；
+- 其余部分通过 `lib.era5.plan.retrieve` 增量下载。
+"""
+
+import glob
+import math
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+from typing import Any, Callable
+
+import cdsapi
+import numpy as np
+import xarray
+
+from .archive import extract_member
+from .manifest import Manifest
+from .names import GRID, SHORT_NAMES
+from .plan import Coverage, existing_coverage, record, retrieve
+from .shard import MAX_WORKERS, merge_files
+
+SINGLE_LEVELS = "reanalysis-era5-single-levels"
+PRESSURE_LEVELS = "reanalysis-era5-pressure-levels"
+
+# 各产品对应的 CDS 数据集、输出文件名与分片方式
+PRODUCTS = {
+    # 按天、每 7 个变量分片
+    "surface": (SINGLE_LEVELS, "surface.zip", {"day": 1, "variable": 7}),
+    # 按天、每 5 个变量分片
+    "geopotential": (PRESSURE_LEVELS, "geopotential.nc", {"day": 1, "variable": 5}),
+    # 范围很小，按天分片即可
+    "single_station": (PRESSURE_LEVELS, "single_station.nc", {"day": 1}),
+}
+
+LIB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES_DIR = os.path.join(LIB_DIR, "cases")
+
+ALL_HOURS = tuple(f"{hour:02d}:00" for hour in range(24))
+ALL_LEVELS = (
+    "1",
+    "2",
+    "3",
+    "5",
+    "7",
+    "10",
+    "20",
+    "30",
+    "50",
+    "70",
+    "100",
+    "125",
+    "150",
+    "175",
+    "200",
+    "225",
+    "250",
+    "300",
+    "350",
+    "400",
+    "450",
+    "500",
+    "550",
+    "600",
+    "650",
+    "700",
+    "750",
+    "775",
+    "800",
+    "825",
+    "850",
+    "875",
+    "900",
+    "925",
+    "950",
+    "975",
+    "1000",
+)
+
+SURFACE_VARIABLES = (
+    "vertical_integral_of_divergence_of_cloud_frozen_water_flux",
+    "vertical_integral_of_divergence_of_cloud_liquid_water_flux",
+    "convective_available_potential_energy",
+    "10m_u_component_of_wind",
+    "10m_v_component_of_wind",
+    "2m_dewpoint_temperature",
+    "2m_temperature",
+    "surface_pressure",
+    "total_precipitation",
+    "mean_sea_level_pressure",
+    "total_cloud_cover",
+    "vertical_integral_of_eastward_water_vapour_flux",
+    "vertical_integral_of_northward_water_vapour_flux",
+    "vertical_integral_of_temperature",
+)
+
+PRESSURE_VARIABLES = (
+    "divergence",
+    "geopotential",
+    "potential_vorticity",
+    "relative_humidity",
+    "specific_humidity",
+    "temperature",
+    "u_component_of_wind",
+    "v_component_of_wind",
+    "vertical_velocity",
+    "vorticity",
+)
+
+STATION_VARIABLES = (
+    "geopotential",
+    "relative_humidity",
+    "specific_humidity",
+    "temperature",
+    "u_component_of_wind",
+    "v_component_of_wind",
+)
+
+
+def snap_area(area, step: float = GRID) -> tuple[float, float, float, float]:
+    """
+    把区域（北、西、南、东）向外扩展到 ERA5 格点上。
+
+    CDS 对不在格点上的区域会重新插值，得到的格点与其他文件不同，既不能从已有文件中截取，
+    也不能与已有文件合并。请求前先对齐，所有文件都取自同一套格点。
+
+    :param area: 北、西、南、东边界，单位为度
+    :param step: 格点间距
+    """
+    north, west, south, east = area
+    eps = 1e-6
+    return (
+        round(math.ceil(north / step - eps) * step, 4),
+        round(math.floor(west / step + eps) * step, 4),
+        round(math.floor(south / step + eps) * step, 4),
+        round(math.ceil(east / step - eps) * step, 4),
+    )
+
+
+def _on_grid(area, origin, step: float = GRID) -> bool:
+    # area 的四条边界是否都落在以 origin 西北角为原点、step 为间距的格点上
+    north, west, south, east = area
+    lat0, lon0 = origin[0], origin[1]
+    offsets = [(north - lat0), (south - lat0), (west - lon0), (east - lon0)]
+    return all(abs(x / step - round(x / step)) < 1e-6 for x in offsets)
+
+
+def _subset(ds: xarray.Dataset, coverage: Coverage) -> xarray.Dataset:
+    names = [SHORT_NAMES.get(v, v) for v in sorted(coverage.variables)]
+    ds = ds[[name for name in names if name in ds.data_vars]]
+    times = np.array(sorted(coverage.times), dtype="datetime64[ns]")
+    ds = ds.isel(valid_time=np.isin(ds["valid_time"].values, times))
+    if coverage.levels and "pressure_level" in ds.dims:
+        levels = [float(p) for p in coverage.levels]
+        ds = ds.isel(pressure_level=np.isin(ds["pressure_level"].values, levels))
+    north, west, south, east = coverage.area
+    lat = ds["latitude"].values
+    lon = ds["longitude"].values
+    return ds.isel(
+        latitude=(lat >= south - 1e-6) & (lat <= north + 1e-6),
+        longitude=(lon >= west - 1e-6) & (lon <= east + 1e-6),
+    )
+
+
+def subset_file(source: str, target: str, coverage: Coverage) -> str:
+    """
+    从 `source` 中截取 `coverage` 范围写入 `target`。zip 压缩包按成员分别截取。
+
+    :param source: 覆盖范围更大的 NetCDF 文件或 CDS zip 压缩包
+    :param target: 输出路径，扩展名应与 `source` 相同
+    :param coverage: 需要截取的范围
+    """
+    tmp = target + ".tmp"
+    if not source.endswith(".zip"):
+        with xarray.open_dataset(source, chunks={}) as ds:
+            _subset(ds, coverage).to_netcdf(tmp)
+        os.replace(tmp, target)
+        return target
+    with (
+        tempfile.TemporaryDirectory() as workdir,
+        zipfile.ZipFile(source) as zip_ref,
+        zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as out,
+    ):
+        for member in zip_ref.namelist():
+            extracted = extract_member(
+                source, member, os.path.join(workdir, "full-" + member), progress=False
+            )
+            with xarray.open_dataset(extracted, chunks={}) as ds:
+                part = _subset(ds, coverage)
+                if not part.data_vars:
+                    continue
+                part_path = os.path.join(workdir, member)
+                part.to_netcdf(part_path)
+            out.write(part_path, arcname=member)
+    os.replace(tmp, target)
+    return target
+
+
+def find_superset(
+    dataset: str, coverage: Coverage, target: str, directories: list[str]
+) -> str | None:
+    """
+    在 `directories` 的下载清单中查找同一 CDS 数据集、覆盖 `coverage` 且网格对齐的文件，
+    返回其中最小的一个。
+
+    :param dataset: CDS 数据集名称
+    :param coverage: 需要覆盖的范围
+    :param target: 将要写入的文件，自身不参与查找
+    :param directories: 查找的目录
+    """
+    suffix = os.path.splitext(target)[1]
+    coverage = replace(coverage, area=snap_area(coverage.area))
+    candidates = []
+    for directory in directories:
+        manifest = Manifest(directory)
+        for name, entry in manifest.entries().items():
+            candidate = os.path.join(directory, name)
+            if (
+                entry.get("dataset") != dataset
+                or "coverage" not in entry
+                or not name.endswith(suffix)
+                or os.path.abspath(candidate) == os.path.abspath(target)
+            ):
+                continue
+            available = Coverage.from_dict(entry["coverage"])
+            if (
+                available.covers(coverage)
+                and _on_grid(coverage.area, available.area)
+                and manifest.validate(candidate)
+            ):
+                candidates.append((entry["size"], candidate))
+    return min(candidates)[1] if candidates else None
+
+
+def _merge_into(target: str, part: str, dataset: str, request: dict) -> str:
+    # 已有文件覆盖所需区域时把 part 合并进去，否则直接替换
+    existing = existing_coverage(target) if os.path.exists(target) else None
+    if existing is not None and existing.contains_area(tuple(request["area"])):
+        merge_files([target, part], target)
+        os.remove(part)
+    else:
+        os.replace(part, target)
+    return record(target, dataset, request)
+
+
+def default_cache_dirs() -> list[str]:
+    """
+    默认查找已有数据的目录：`lib` 目录与 `lib/cases` 下的各个个例目录。
+    """
+    return [LIB_DIR] + sorted(glob.glob(os.path.join(CASES_DIR, "*")))
+
+
+@dataclass(frozen=True)
+class CaseConfig:
+    """
+    一次个例研究所需 ERA5 数据的描述。区域均为 (北, 西, 南, 东)。
+    """
+
+    name: str
+    """个例名称，同时是 `lib/cases` 下的数据目录名"""
+    start: str
+    """起始日期，`"YYYY-MM-DD"`"""
+    end: str
+    """结束日期（含），`"YYYY-MM-DD"`"""
+    area: tuple[float, float, float, float] = (60, 60, 10, 140)
+    """等压面大尺度数据的区域"""
+    levels: tuple[str, ...] = ("500", "700", "850", "925")
+    """等压面大尺度数据的气压层"""
+    pressure_variables: tuple[str, ...] = PRESSURE_VARIABLES
+    hours: tuple[str, ...] = ALL_HOURS
+    """单层与等压面大尺度数据的时次"""
+    surface_area: tuple[float, float, float, float] = (50, 70, 10, 140)
+    surface_variables: tuple[str, ...] = SURFACE_VARIABLES
+    station_area: tuple[float, float, float, float] | None = (23.4, 113.2, 23.1, 113.5)
+    """单站数据的区域，为 None 时不获取单站数据。各区域在请求时向外对齐到格点，见 `snap_area`"""
+    station_levels: tuple[str, ...] = ALL_LEVELS
+    station_hours: tuple[str, ...] = (
+        "00:00",
+        "04:00",
+        "05:00",
+        "06:00",
+        "07:00",
+        "08:00",
+        "12:00",
+    )
+    station_variables: tuple[str, ...] = STATION_VARIABLES
+    directory: str | None = None
+    """数据目录，默认为 `lib/cases/<name>`"""
+
+    @property
+    def output_dir(self) -> str:
+        return self.directory or os.path.join(CASES_DIR, self.name)
+
+    def target(self, product: str) -> str:
+        """
+        产品的输出文件路径。
+
+        :param product: `"surface"`、`"geopotential"` 或 `"single_station"`
+        """
+        return os.path.join(self.output_dir, PRODUCTS[product][1])
+
+    def days(self) -> list[date]:
+        first, last = date.fromisoformat(self.start), date.fromisoformat(self.end)
+        return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+    def _dated(self, base: dict, hours: tuple[str, ...]) -> list[dict]:
+        # CDS 请求是年、月、日的笛卡尔积，跨月时按月拆分，避免多请求不需要的日期
+        by_month: dict[tuple[int, int], list[str]] = {}
+        for day in self.days():
+            by_month.setdefault((day.year, day.month), []).append(f"{day.day:02d}")
+        return [
+            {
+                **base,
+                "year": [f"{year}"],
+                "month": [f"{month:02d}"],
+                "day": days,
+                "time": list(hours),
+            }
+            for (year, month), days in by_month.items()
+        ]
+
+    def requests(self, product: str) -> list[dict]:
+        """
+        产品对应的完整 CDS 请求（未去除与其他产品的重叠）。跨月时每月一个请求。
+
+        :param product: `"surface"`、`"geopotential"` 或 `"single_station"`
+        """
+        base = {"product_type": ["reanalysis"], "data_format": "netcdf"}
+        if product == "surface":
+            base |= {
+                "variable": list(self.surface_variables),
+                "download_format": "zip",
+                "area": list(snap_area(self.surface_area)),
+            }
+            return self._dated(base, self.hours)
+        base["download_format"] = "unarchived"
+        if product == "geopotential":
+            base |= {
+                "variable": list(self.pressure_variables),
+                "pressure_level": list(self.levels),
+                "area": list(snap_area(self.area)),
+            }
+            return self._dated(base, self.hours)
+        if product == "single_station":
+            if self.station_area is None:
+                return []
+            base |= {
+                "variable": list(self.station_variables),
+                "pressure_level": list(self.station_levels),
+                "area": list(snap_area(self.station_area)),
+            }
+            return self._dated(base, self.station_hours)
+        raise ValueError(f"Unknown product: {product}")
+
+    def borrowed_levels(self) -> list[str]:
+        """
+        单站数据中可以直接从等压面大尺度数据截取的气压层。要求变量、时次被大尺度数据覆盖，
+        且（对齐后的）单站区域落在大尺度数据的格点上，否则截取结果与下载结果不同。
+        """
+        if (
+            self.station_area is None
+            or not set(self.station_variables) <= set(self.pressure_variables)
+            or not set(self.station_hours) <= set(self.hours)
+        ):
+            return []
+        station = snap_area(self.station_area)
+        north, west, south, east = station
+        n, w, s, e = snap_area(self.area)
+        if not (north <= n and south >= s and west >= w and east <= e):
+            return []
+        if not _on_grid(station, (n, w, s, e)):
+            return []
+        return [p for p in self.station_levels if p in self.levels]
+
+    def download_requests(self, product: str) -> list[dict]:
+        """
+        去除与其他产品重叠后，真正需要向 CDS 请求的部分。
+        """
+        requests = self.requests(product)
+        if product != "single_station":
+            return requests
+        borrowed = self.borrowed_levels()
+        remaining = [p for p in self.station_levels if p not in borrowed]
+        if not remaining:
+            return []
+        return [{**request, "pressure_level": remaining} for request in requests]
+
+    def fetch(
+        self,
+        product: str,
+        max_workers: int = MAX_WORKERS,
+        client_factory: Callable[[], Any] = cdsapi.Client,
+        cache_dirs: list[str] | None = None,
+    ) -> str:
+        """
+        确保产品文件覆盖本个例，返回文件路径。依次尝试：已有文件、磁盘上的其他文件、增量下载。
+
+        :param product: `"surface"`、`"geopotential"` 或 `"single_station"`
+        :param max_workers: 并发下载的分片数
+        :param client_factory: 创建 CDS 客户端的函数，离线测试时可传入 `LocalClient`
+        :param cache_dirs: 查找已有数据的目录，默认为 `default_cache_dirs()`
+        """
+        dataset, _, shard_by = PRODUCTS[product]
+        target = self.target(product)
+        os.makedirs(self.output_dir, exist_ok=True)
+        if cache_dirs is None:
+            cache_dirs = default_cache_dirs()
+
+        for request in self.download_requests(product):
+            self._ensure(
+                dataset,
+                request,
+                target,
+                shard_by,
+                max_workers,
+                client_factory,
+                cache_dirs,
+            )
+
+        borrowed = self.borrowed_levels() if product == "single_station" else []
+        if borrowed:
+            source = self.fetch("geopotential", max_workers, client_factory, cache_dirs)
+            for request in self.requests(product):
+                request = {**request, "pressure_level": borrowed}
+                wanted = Coverage.of_request(request)
+                existing = existing_coverage(target) if os.path.exists(target) else None
+                if existing is not None and existing.covers(wanted):
+                    continue
+                print(
+                    f"Taking {len(borrowed)} level(s) from {os.path.basename(source)}..."
+                )
+                part = subset_file(source, target + ".borrowed.nc", wanted)
+                _merge_into(target, part, dataset, request)
+        return target
+
+    @staticmethod
+    def _ensure(dataset, request, target, shard_by, max_workers, client_factory, dirs):
+        wanted = Coverage.of_request(request)
+        existing = existing_coverage(target) if os.path.exists(target) else None
+        if existing is not None and existing.covers(wanted):
+            return
+        superset = find_superset(dataset, wanted, target, dirs)
+        if superset is not None:
+            print(f"Reusing {superset} for {os.path.basename(target)}...")
+            suffix = os.path.splitext(target)[1]
+            part = subset_file(superset, f"{target}.reused{suffix}", wanted)
+            _merge_into(target, part, dataset, request)
+            return
+        retrieve(dataset, request, target, shard_by, max_workers, client_factory)
+
+    def fetch_all(
+        self,
+        max_workers: int = MAX_WORKERS,
+        client_factory: Callable[[], Any] = cdsapi.Client,
+        cache_dirs: list[str] | None = None,
+    ) -> dict[str, str]:
+        """
+        获取本个例的全部产品，返回产品名到文件路径的映射。
+        """
+        return {
+            product: self.fetch(product, max_workers, client_factory, cache_dirs)
+            for product in PRODUCTS
+            if self.requests(product)
+        }
+
+
+def fetch_cases(
+    cases: list[CaseConfig],
+    max_workers: int = MAX_WORKERS,
+    client_factory: Callable[[], Any] = cdsapi.Client,
+) -> dict[str, dict[str, str]]:
+    """
+    依次获取多个个例的数据。先获取的个例的文件会被后面的个例复用，因此重叠的个例不会重复下载。
+
+    ## Example:
+    ```python
+    from lib.era5.case import CaseConfig, fetch_cases
+
+    fetch_cases([
+        CaseConfig("foshan-2024-04", "2024-04-26", "2024-04-27"),
+        CaseConfig("guangzhou-2024-04", "2024-04-27", "2024-04-28"),
+    ])
+    ```
+    """
+    return {case.name: case.fetch_all(max_workers, client_factory) for case in cases}
+
+
+THESIS_CASE = CaseConfig(
+    name="thesis",
+    start="2024-04-26",
+    end="2024-04-28",
+    directory=LIB_DIR,
+)
+"""论文个例：2024 年 4 月 27 日广州白云区龙卷，数据保存在 `lib` 目录下"""
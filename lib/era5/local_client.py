@@ -0,0 +1,158 @@
+"""
+`cdsapi.Client` 的本地替身，按请求内容合成与 CDS 输出结构相同的 ERA5 文件，
+用于在没有网络和 CDS 账号时测试、评测分片下载与合并。
+"""
+
+import os
+import tempfile
+import threading
+import time
+import zipfile
+
+import numpy as np
+import xarray
+
+from .names import ACCUMULATED, GRID, SHORT_NAMES
+
+# netCDF4/HDF5 不是线程安全的，分片下载的多个线程同时写文件会损坏内存，写文件时须持有此锁
+_netcdf_lock = threading.Lock()
+
+
+def request_times(request: dict) -> np.ndarray:
+    """
+    请求覆盖的全部时刻，按时间排序。
+    """
+    stamps = [
+        f"{year}-{month}-{day}T{hour}"
+        for year in request["year"]
+        for month in request["month"]
+        for day in request["day"]
+        for hour in request["time"]
+    ]
+    return np.array(sorted(stamps), dtype="datetime64[ns]")
+
+
+def request_grid(request: dict) -> tuple[np.ndarray, np.ndarray]:
+    """
+    请求 `area`（北、西、南、东）对应的纬度（自北向南）与经度格点。
+    """
+    north, west, south, east = request["area"]
+    n_lat = int(round((north - south) / GRID)) + 1
+    n_lon = int(round((east - west) / GRID)) + 1
+    latitude = np.round(north - GRID * np.arange(n_lat), 4)
+    longitude = np.round(west + GRID * np.arange(n_lon), 4)
+    return latitude, longitude
+
+
+def synthesize(request: dict, variables: list[str]) -> xarray.Dataset:
+    """
+    合成请求对应的数据集。数值由坐标确定性地生成，因此分片下载后合并的结果与一次下载完全相同。
+
+    :param request: CDS 请求
+    :param variables: 需要合成的 CDS 变量名
+    """
+    valid_time = request_times(request)
+    latitude, longitude = request_grid(request)
+    coords = {"valid_time": valid_time}
+    dims = ["valid_time"]
+    hours = (valid_time - np.datetime64("2000-01-01")) / np.timedelta64(1, "h")
+    field = hours[:, None, None] * 1e-4
+    if "pressure_level" in request:
+        levels = np.array(sorted(float(p) for p in request["pressure_level"]))[::-1]
+        coords["pressure_level"] = levels
+        dims.append("pressure_level")
+        field = field[:, None] + levels[None, :, None, None] * 1e-2
+    coords["latitude"] = latitude
+    coords["longitude"] = longitude
+    dims += ["latitude", "longitude"]
+    field = field + latitude[:, None] * 1e-1 + longitude[None, :] * 1e-2
+
+    data_vars = {}
+    for variable in variables:
+        short = SHORT_NAMES.get(variable, variable)
+        offset = sum(map(ord, short))
+        data_vars[short] = (dims, (field + offset).astype("float32"))
+    return xarray.Dataset(data_vars, coords=coords)
+
+
+class LocalClient:
+    """
+    与 `cdsapi.Client` 接口一致的本地客户端。
+
+    ## Example:
+    ```python
+    from lib.era5.local_client import LocalClient
+    from lib.era5.shard import fetch_sharded
+
+    fetch_sharded(dataset, request, "out.nc", {"day": 1}, client_factory=lambda: LocalClient(latency=2))
+    ```
+    """
+
+    # 所有实例共享的调用记录，便于在 `client_factory` 每次新建客户端时统计请求次数
+    calls: list[dict] = []
+    _lock = threading.Lock()
+
+    def __init__(self, latency: float = 0.0, seconds_per_mib: float = 0.0):
+        """
+        :param latency: 每个请求的排队延迟，单位秒，用于模拟 CDS 排队
+        :param seconds_per_mib: 每 MiB 输出的传输耗时，单位秒，用于模拟带宽
+        """
+        self.latency = latency
+        self.seconds_per_mib = seconds_per_mib
+
+    def retrieve(self, name: str, request: dict, target: str | None = None):
+        """
+        合成请求对应的文件并写入 `target`。不给出 `target` 时返回一个可稍后下载的结果对象，
+        与 `cdsapi` 一致。
+        """
+        if target is None:
+            return LocalResult(self, name, request)
+        time.sleep(self.latency)
+        variables = request["variable"]
+        if request.get("download_format") == "zip":
+            self._write_zip(request, variables, target)
+        else:
+            dataset = synthesize(request, variables)
+            with _netcdf_lock:
+                dataset.to_netcdf(target)
+        size = os.path.getsize(target)
+        time.sleep(self.seconds_per_mib * size / 1048576)
+        with self._lock:
+            LocalClient.calls.append(
+                {"dataset": name, "request": request, "bytes": size}
+            )
+        return target
+
+    @staticmethod
+    def _write_zip(request: dict, variables: list[str], target: str):
+        groups = {
+            "instant": [v for v in variables if v not in ACCUMULATED],
+            "accum": [v for v in variables if v in ACCUMULATED],
+        }
+        with (
+            tempfile.TemporaryDirectory() as workdir,
+            zipfile.ZipFile(target, "w", zipfile.ZIP_STORED) as out,
+        ):
+            for step_type, group in groups.items():
+                if not group:
+                    continue
+                member = f"data_stream-oper_stepType-{step_type}.nc"
+                member_path = os.path.join(workdir, member)
+                dataset = synthesize(request, group)
+                with _netcdf_lock:
+                    dataset.to_netcdf(member_path)
+                out.write(member_path, arcname=member)
+
+
+class LocalResult:
+    """
+    `LocalClient.retrieve` 不给出下载路径时返回的结果。没有 `location`，因此不支持续传。
+    """
+
+    def __init__(self, client: LocalClient, name: str, request: dict):
+        self.client = client
+        self.name = name
+        self.request = request
+
+    def download(self, target: str) -> str:
+        return self.client.retrieve(self.name, self.request, target)
@@ -0,0 +1,139 @@
+"""
+下载清单：记录每个下载文件对应的请求摘要、字节数、修改时间和 SHA-256 校验和，
+用于断点续传和启动时的快速校验。
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_NAME = "era5_manifest.json"
+
+# 计算校验和时每次读取的字节数
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def request_hash(dataset: str, request: dict) -> str:
+    """
+    请求的摘要，请求内容相同（与键顺序无关）时摘要相同。
+    """
+    payload = json.dumps([dataset, request], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def file_sha256(target: str) -> str:
+    """
+    分块计算文件的 SHA-256 校验和。
+    """
+    digest = hashlib.sha256()
+    with open(target, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    一个目录下的下载清单，以 JSON 文件保存，键为文件名。
+    """
+
+    def __init__(self, directory: str, name: str = MANIFEST_NAME):
+        """
+        :param directory: 被记录文件所在的目录，清单文件也保存在这里
+        :param name: 清单文件名
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, name)
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, entries: dict[str, dict]):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def entries(self) -> dict[str, dict]:
+        """
+        全部清单条目，键为文件名。
+        """
+        return self._load()
+
+    def get(self, target: str) -> dict | None:
+        """
+        返回 `target` 的清单条目，不存在时返回 None。
+        """
+        return self._load().get(os.path.basename(target))
+
+    def update(self, target: str, **fields):
+        """
+        更新 `target` 的清单条目中的若干字段。
+        """
+        with self._lock:
+            entries = self._load()
+            entries.setdefault(os.path.basename(target), {}).update(fields)
+            self._save(entries)
+
+    def record(self, target: str, dataset: str, request: dict, **fields):
+        """
+        文件写入完成后记录其请求摘要、字节数、修改时间与校验和，覆盖旧条目。
+
+        :param target: 已写入完成的文件
+        :param dataset: CDS 数据集名称
+        :param request: 生成该文件的请求
+        :param fields: 需要一并记录的其他字段
+        """
+        stat = os.stat(target)
+        entry = {
+            "dataset": dataset,
+            "request_hash": request_hash(dataset, request),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(target),
+            **fields,
+        }
+        with self._lock:
+            entries = self._load()
+            entries[os.path.basename(target)] = entry
+            self._save(entries)
+
+    def validate(
+        self,
+        target: str,
+        digest: str | None = None,
+        full: bool = False,
+        missing_ok: bool = False,
+    ) -> bool:
+        """
+        校验 `target` 是否与清单一致。默认只比较字节数与修改时间，不读取文件内容；
+        仅当修改时间变化（例如文件被复制过）或 `full=True` 时才重新计算校验和。
+
+        :param target: 需要校验的文件
+        :param digest: 期望的请求摘要，给出时还要求请求一致
+        :param full: 是否总是重新计算校验和
+        :param missing_ok: 清单中没有该文件时是否视为通过（用于清单出现之前下载的文件）
+        """
+        entry = self.get(target)
+        if entry is None or "size" not in entry:
+            return missing_ok and os.path.exists(target)
+        if digest is not None and entry.get("request_hash") != digest:
+            return False
+        try:
+            stat = os.stat(target)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        if not full and stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        if file_sha256(target) != entry["sha256"]:
+            return False
+        self.update(target, mtime_ns=stat.st_mtime_ns)
+        return True
@@ -0,0 +1,40 @@
+"""
+ERA5 变量在 CDS 请求中的名称与 NetCDF 输出中的短名的对应关系。
+"""
+
+# ERA5 再分析资料的格点间距，单位为度
+GRID = 0.25
+
+# CDS 变量名到 NetCDF 变量短名
+SHORT_NAMES = {
+    "divergence": "d",
+    "geopotential": "z",
+    "potential_vorticity": "pv",
+    "relative_humidity": "r",
+    "specific_humidity": "q",
+    "temperature": "t",
+    "u_component_of_wind": "u",
+    "v_component_of_wind": "v",
+    "vertical_velocity": "w",
+    "vorticity": "vo",
+    "vertical_integral_of_divergence_of_cloud_frozen_water_flux": "viiwd",
+    "vertical_integral_of_divergence_of_cloud_liquid_water_flux": "vilwd",
+    "convective_available_potential_energy": "cape",
+    "10m_u_component_of_wind": "u10",
+    "10m_v_component_of_wind": "v10",
+    "2m_dewpoint_temperature": "d2m",
+    "2m_temperature": "t2m",
+    "surface_pressure": "sp",
+    "total_precipitation": "tp",
+    "mean_sea_level_pressure": "msl",
+    "total_cloud_cover": "tcc",
+    "vertical_integral_of_eastward_water_vapour_flux": "viwve",
+    "vertical_integral_of_northward_water_vapour_flux": "viwvn",
+    "vertical_integral_of_temperature": "vit",
+}
+
+# 累积量在 zip 输出中单独存放于 stepType-accum 文件
+ACCUMULATED = {"total_precipitation"}
+
+# 短名到 CDS 变量名
+LONG_NAMES = {short: long for long, short in SHORT_NAMES.items()}
@@ -0,0 +1,319 @@
+"""
+按已有文件的覆盖范围规划增量下载：只请求缺失的变量、时次和气压层，再合并进已有文件。
+"""
+
+import mmap
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import cdsapi
+import netCDF4
+import numpy as np
+import xarray
+
+from .archive import extract_member, stored_member
+from .manifest import Manifest
+from .names import GRID, LONG_NAMES
+from .shard import MAX_WORKERS, fetch_sharded, merge_files
+
+
+def _level(value) -> str:
+    return f"{float(value):g}"
+
+
+def _time(year, month, day, hour) -> str:
+    return f"{int(year):04d}-{int(month):02d}-{int(day):02d}T{hour}"
+
+
+@dataclass(frozen=True)
+class Coverage:
+    """
+    一个 ERA5 文件（或请求）覆盖的变量、时次、气压层与区域。
+    """
+
+    variables: frozenset[str]
+    """CDS 变量名"""
+    times: frozenset[str]
+    """`"YYYY-MM-DDTHH:MM"` 格式的时刻"""
+    levels: frozenset[str]
+    """气压层，单层数据为空"""
+    area: tuple[float, float, float, float]
+    """北、西、南、东边界"""
+
+    def to_dict(self) -> dict:
+        return {
+            "variables": sorted(self.variables),
+            "times": sorted(self.times),
+            "levels": sorted(self.levels, key=float),
+            "area": list(self.area),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Coverage":
+        return cls(
+            variables=frozenset(d["variables"]),
+            times=frozenset(d["times"]),
+            levels=frozenset(d["levels"]),
+            area=tuple(d["area"]),
+        )
+
+    @classmethod
+    def of_request(cls, request: dict) -> "Coverage":
+        times = frozenset(
+            _time(year, month, day, hour)
+            for year in request["year"]
+            for month in request["month"]
+            for day in request["day"]
+            for hour in request["time"]
+        )
+        return cls(
+            variables=frozenset(request["variable"]),
+            times=times,
+            levels=frozenset(_level(p) for p in request.get("pressure_level", [])),
+            area=tuple(float(x) for x in request["area"]),
+        )
+
+    @classmethod
+    def of_dataset(cls, ds: xarray.Dataset) -> "Coverage":
+        times = np.datetime_as_string(ds["valid_time"].values, unit="m")
+        levels = ds["pressure_level"].values if "pressure_level" in ds.coords else []
+        lat = ds["latitude"].values
+        lon = ds["longitude"].values
+        return cls(
+            variables=frozenset(
+                LONG_NAMES.get(name, name) for name in ds.data_vars if ds[name].dims
+            ),
+            times=frozenset(times),
+            levels=frozenset(_level(p) for p in levels),
+            area=(
+                float(lat.max()),
+                float(lon.min()),
+                float(lat.min()),
+                float(lon.max()),
+            ),
+        )
+
+    @classmethod
+    def of_file(cls, target: str) -> "Coverage":
+        """
+        读取 NetCDF 文件或 CDS zip 压缩包的覆盖范围。只读取坐标，不读取变量数据。
+
+        压缩包中未压缩的成员（CDS 与 `LocalClient` 的压缩包都是如此）通过内存映射直接打开，不解压；
+        经过压缩的成员无法随机访问，仍需解压到临时目录。
+        """
+        if not target.endswith(".zip"):
+            with xarray.open_dataset(target) as ds:
+                return cls.of_dataset(ds)
+        coverages = []
+        with (
+            open(target, "rb") as f,
+            zipfile.ZipFile(f) as z,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+            tempfile.TemporaryDirectory() as workdir,
+        ):
+            for info in z.infolist():
+                if info.compress_type == zipfile.ZIP_STORED:
+                    with stored_member(mapped, info) as data:
+                        nc = netCDF4.Dataset(info.filename, memory=data)
+                        store = xarray.backends.NetCDF4DataStore(nc)
+                        with xarray.open_dataset(store) as ds:
+                            coverages.append(cls.of_dataset(ds))
+                    continue
+                extracted = extract_member(
+                    target,
+                    info.filename,
+                    os.path.join(workdir, info.filename),
+                    progress=False,
+                )
+                with xarray.open_dataset(extracted) as ds:
+                    coverages.append(cls.of_dataset(ds))
+        return cls(
+            variables=frozenset().union(*(c.variables for c in coverages)),
+            times=frozenset.intersection(*(c.times for c in coverages)),
+            levels=frozenset.intersection(*(c.levels for c in coverages)),
+            area=coverages[0].area,
+        )
+
+    def contains_area(self, area: tuple[float, float, float, float]) -> bool:
+        """
+        是否覆盖 `area`。CDS 会把区域对齐到格点，因此允许不足一个格距的差异。
+        """
+        north, west, south, east = area
+        n, w, s, e = self.area
+        tol = GRID - 1e-6
+        return (
+            n >= north - tol
+            and w <= west + tol
+            and s <= south + tol
+            and e >= east - tol
+        )
+
+    def covers(self, other: "Coverage") -> bool:
+        """
+        是否完整覆盖 `other` 的变量、时次、气压层与区域。
+        """
+        return (
+            other.variables <= self.variables
+            and other.times <= self.times
+            and other.levels <= self.levels
+            and self.contains_area(other.area)
+        )
+
+
+@dataclass
+class Plan:
+    """
+    增量下载计划。
+    """
+
+    requests: list[dict]
+    """需要下载的请求，每个请求都是一个完整的超立方体"""
+    replace: bool
+    """是否需要整体重新下载并替换已有文件（区域不覆盖时无法追加）"""
+
+
+def _time_requests(base: dict, times: set[str]) -> list[dict]:
+    # 同一天缺失的小时相同时可以合成一个请求；按 (年, 月, 小时集合) 分组
+    by_day: dict[tuple[str, str, str], set[str]] = {}
+    for stamp in times:
+        date, hour = stamp.split("T")
+        year, month, day = date.split("-")
+        by_day.setdefault((year, month, day), set()).add(hour)
+    groups: dict[tuple[str, str, tuple[str, ...]], list[str]] = {}
+    for (year, month, day), hours in by_day.items():
+        groups.setdefault((year, month, tuple(sorted(hours))), []).append(day)
+    return [
+        {
+            **base,
+            "year": [year],
+            "month": [month],
+            "day": sorted(days),
+            "time": list(hours),
+        }
+        for (year, month, hours), days in sorted(groups.items())
+    ]
+
+
+def plan_missing(request: dict, existing: Coverage) -> Plan:
+    """
+    比较请求与已有文件的覆盖范围，给出只包含缺失部分的下载计划。
+
+    缺失的变量按整个请求范围下载；已有变量再分别补齐缺失的气压层与时次。
+    补充请求使用已有文件的区域，保证合并后的网格仍是完整的矩形。
+
+    :param request: 期望覆盖的 CDS 请求
+    :param existing: 已有文件的覆盖范围
+    """
+    wanted = Coverage.of_request(request)
+    if not existing.contains_area(wanted.area):
+        return Plan([dict(request)], replace=True)
+
+    base = {**request, "area": list(existing.area)}
+    requests = []
+    missing_variables = wanted.variables - existing.variables
+    present_variables = [v for v in request["variable"] if v not in missing_variables]
+    if missing_variables:
+        requests.append(
+            {
+                **base,
+                "variable": [v for v in request["variable"] if v in missing_variables],
+            }
+        )
+    if present_variables:
+        base = {**base, "variable": present_variables}
+        missing_levels = wanted.levels - existing.levels
+        if missing_levels:
+            requests.append(
+                {
+                    **base,
+                    "pressure_level": [
+                        p
+                        for p in request["pressure_level"]
+                        if _level(p) in missing_levels
+                    ],
+                }
+            )
+        missing_times = wanted.times - existing.times
+        present_levels = [
+            p
+            for p in request.get("pressure_level", [])
+            if _level(p) not in missing_levels
+        ]
+        if missing_times and (present_levels or not wanted.levels):
+            if present_levels:
+                base = {**base, "pressure_level": present_levels}
+            requests += _time_requests(base, missing_times)
+    return Plan(requests, replace=False)
+
+
+def existing_coverage(target: str) -> Coverage | None:
+    """
+    已有文件的覆盖范围。清单校验通过时直接使用清单中记录的覆盖范围，不打开文件；
+    文件与清单不符或无法读取时返回 None，表示需要重新下载。
+    """
+    manifest = Manifest(os.path.dirname(os.path.abspath(target)))
+    entry = manifest.get(target)
+    if entry is not None:
+        if not manifest.validate(target):
+            return None
+        if "coverage" in entry:
+            return Coverage.from_dict(entry["coverage"])
+    try:
+        return Coverage.of_file(target)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def record(target: str, dataset: str, request: dict) -> str:
+    """
+    在 `target` 所在目录的下载清单中记录文件的校验和与覆盖范围。
+    """
+    manifest = Manifest(os.path.dirname(os.path.abspath(target)))
+    coverage = Coverage.of_file(target).to_dict()
+    manifest.record(target, dataset, request, coverage=coverage)
+    return target
+
+
+def retrieve(
+    dataset: str,
+    request: dict,
+    target: str,
+    shard_by: dict[str, int],
+    max_workers: int = MAX_WORKERS,
+    client_factory: Callable[[], Any] = cdsapi.Client,
+) -> str:
+    """
+    确保 `target` 覆盖 `request`。文件不存在或已损坏时完整下载；已存在时只下载缺失部分并合并进去。
+    完成后在同目录的下载清单中记录文件的校验和与覆盖范围。
+
+    参数同 `lib.era5.shard.fetch_sharded`。
+    """
+    existing = existing_coverage(target) if os.path.exists(target) else None
+    if existing is None:
+        if os.path.exists(target):
+            print(f"{os.path.basename(target)} is damaged, re-downloading...")
+        fetch_sharded(dataset, request, target, shard_by, max_workers, client_factory)
+        return record(target, dataset, request)
+    plan = plan_missing(request, existing)
+    if plan.replace:
+        print(f"{os.path.basename(target)} does not cover the area, re-downloading...")
+        fetch_sharded(dataset, request, target, shard_by, max_workers, client_factory)
+        return record(target, dataset, request)
+    if not plan.requests:
+        print(f"{os.path.basename(target)} is up to date.")
+        return target
+
+    suffix = os.path.splitext(target)[1]
+    parts = []
+    for i, missing in enumerate(plan.requests):
+        part = f"{target}.missing-{i}{suffix}"
+        fetch_sharded(dataset, missing, part, shard_by, max_workers, client_factory)
+        parts.append(part)
+    print(f"Merging {len(parts)} missing part(s) into {os.path.basename(target)}...")
+    merge_files([target] + parts, target)
+    for part in parts:
+        os.remove(part)
+    return record(target, dataset, request)
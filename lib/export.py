@@ -0,0 +1,351 @@
+"""
+保存图片：矢量格式中的栅格化策略与文件大小预算。
+
+论文图片保存为 SVG。填色图、流线、雷达回波等图层由成千上万条路径组成，矢量输出动辄数 MB，
+保存和在 Figma 中打开都很慢。`save` 在保存矢量格式时，只把 `rasterize` 中列出的图层以 `dpi`
+嵌入为位图，文字、行政边界、等值线、风羽仍保持矢量；相邻的栅格化图层由 Matplotlib 合并为一张图片。
+
+图层按画出它的方法区分：
+
+- `"contourf"`：填色等值线（`contourf`）
+- `"mesh"`：网格填色与图像（`pcolormesh`、`imshow`），例如雷达回波
+- `"streamplot"`：流线，需用 `Map.streamplot` 绘制或用 `tag` 标记，否则无法与其他线条区分
+- `"contour"`、`"barbs"`、`"quiver"`：等值线、风羽、风矢，默认保持矢量
+
+保存后返回 `SaveReport`，记录文件大小与耗时。指定 `budget` 时，文件超出预算则逐步降低栅格化的
+dpi 重新保存，降到 `MIN_RASTER_DPI` 仍超出时报错。
+
+同一张图常要输出多种格式（论文用 SVG、幻灯片用 PNG、网页索引用缩略图）。`save_all` 只用 Agg
+绘制一次位图：以所需的最高分辨率绘制，其余分辨率与缩略图由 Pillow 缩小得到，各文件在线程中
+编码写出，同时主线程保存矢量格式。多输出几种位图格式几乎不增加耗时。
+"""
+
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import matplotlib
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.axes import Axes
+from matplotlib.collections import QuadMesh
+from matplotlib.contour import ContourSet
+from matplotlib.figure import Figure
+from matplotlib.image import AxesImage
+from matplotlib.quiver import Barbs, Quiver
+
+RASTER_LAYERS = ("contourf", "mesh", "streamplot")
+"""保存矢量格式时默认栅格化的图层"""
+
+RASTER_DPI = 200
+"""栅格化图层的默认分辨率"""
+
+MIN_RASTER_DPI = 72
+"""为满足大小预算降低分辨率时的下限"""
+
+VECTOR_FORMATS = ("svg", "svgz", "pdf", "eps", "ps")
+"""栅格化策略只对这些格式生效，位图格式整张图都是栅格"""
+
+OPAQUE_FORMATS = ("jpg", "jpeg", "bmp")
+"""不支持透明通道的位图格式，保存前转为 RGB"""
+
+_tags: "weakref.WeakKeyDictionary[Artist, str]" = weakref.WeakKeyDictionary()
+
+
+def tag(artists: Artist | Iterable[Artist], layer: str):
+    """
+    把按类型无法识别的图元标记为 `layer` 图层，例如流线的 `LineCollection` 与箭头。
+
+    :param artists: 一个或多个图元
+    :param layer: 图层名，例如 `"streamplot"`
+    """
+    if isinstance(artists, Artist):
+        artists = [artists]
+    for artist in artists:
+        _tags[artist] = layer
+
+
+def layer_of(artist: Artist) -> str | None:
+    """
+    图元所属的图层，无法识别时返回 None（保持矢量）。
+    """
+    if artist in _tags:
+        return _tags[artist]
+    if isinstance(artist, ContourSet):
+        return "contourf" if artist.filled else "contour"
+    if isinstance(artist, (QuadMesh, AxesImage)):
+        return "mesh"
+    if isinstance(artist, Barbs):
+        return "barbs"
+    if isinstance(artist, Quiver):
+        return "quiver"
+    return None
+
+
+@contextmanager
+def rasterized(axes: Iterable[Axes], layers: Iterable[str]):
+    """
+    在上下文中把 `axes` 里属于 `layers` 的图元设为栅格化，退出时恢复。
+
+    :return: 各图层被栅格化的图元个数
+    """
+    layers = set(layers)
+    changed: list[tuple[Artist, bool]] = []
+    counts: dict[str, int] = {}
+    for ax in axes:
+        for artist in ax.get_children():
+            layer = layer_of(artist)
+            if layer in layers:
+                changed.append((artist, artist.get_rasterized()))
+                artist.set_rasterized(True)
+                counts[layer] = counts.get(layer, 0) + 1
+    try:
+        yield counts
+    finally:
+        for artist, previous in changed:
+            artist.set_rasterized(previous)
+
+
+@dataclass(frozen=True)
+class SaveReport:
+    """
+    一次保存的结果。
+    """
+
+    path: str
+    bytes: int
+    """文件大小"""
+    seconds: float
+    """保存所用的时间，包括为满足预算而重新保存的时间"""
+    dpi: float | None = None
+    """栅格化图层最终使用的分辨率，位图格式为整张图的分辨率"""
+    rasterized: dict = field(default_factory=dict)
+    """各图层被栅格化的图元个数"""
+    attempts: int = 1
+    """保存次数，超出预算时大于 1"""
+    shared: float = 0.0
+    """`save_all` 中与其他位图输出共用的绘制时间，不计入 `seconds`"""
+
+    def __str__(self) -> str:
+        layers = ", ".join(f"{k}×{v}" for k, v in self.rasterized.items())
+        return (
+            f"{self.bytes / 1024**2:>7.2f} MB  {self.seconds:>6.2f}s  {self.path}"
+            + (f"  [栅格化 {layers} @ {self.dpi:g} dpi]" if layers else "")
+            + (f"  [共用绘制 {self.shared:.2f}s]" if self.shared else "")
+        )
+
+
+def save(
+    fig: Figure,
+    output: str,
+    axes: Iterable[Axes] | None = None,
+    rasterize: Iterable[str] = RASTER_LAYERS,
+    dpi: float | None = None,
+    budget: int | None = None,
+    **kwargs,
+) -> SaveReport:
+    """
+    保存图片，矢量格式中栅格化 `rasterize` 列出的图层。
+
+    :param fig: 要保存的图
+    :param output: 输出路径，格式由扩展名决定
+    :param axes: 应用栅格化策略的坐标轴，默认为图中所有坐标轴。
+        `Map.save` 只传入地图本身，色标保持矢量
+    :param rasterize: 栅格化的图层，为空时与直接调用 `savefig` 相同
+    :param dpi: 矢量格式中栅格化图层的分辨率，默认为 `RASTER_DPI`；位图格式为整张图的分辨率，
+        默认同 `savefig`
+    :param budget: 文件大小上限，单位为字节
+    :param kwargs: 传给 `Figure.savefig` 的其他参数
+
+    ## Example:
+    ```python
+    report = save(fig, "images/500hPa.svg", budget=2 * 1024**2)
+    print(report)  # "   0.84 MB    1.20s  images/500hPa.svg  [栅格化 contourf×1 @ 200 dpi]"
+    ```
+    """
+    ext = os.path.splitext(output)[1].lstrip(".").lower()
+    vector = (kwargs.get("format") or ext) in VECTOR_FORMATS
+    if dpi is None:
+        dpi = RASTER_DPI if vector else matplotlib.rcParams["savefig.dpi"]
+    if dpi == "figure":
+        dpi = fig.dpi
+    if not vector:
+        rasterize = ()
+    axes = fig.axes if axes is None else list(axes)
+
+    start = time.perf_counter()
+    attempts = 0
+    with rasterized(axes, rasterize) as counts:
+        while True:
+            attempts += 1
+            fig.savefig(output, dpi=dpi, **kwargs)
+            size = os.path.getsize(output)
+            # 只有存在栅格内容时，降低分辨率才能减小文件
+            if budget is None or size <= budget or (vector and not counts):
+                break
+            if dpi <= MIN_RASTER_DPI:
+                break
+            dpi = max(MIN_RASTER_DPI, round(dpi * 0.7))
+    report = SaveReport(
+        output, size, time.perf_counter() - start, dpi, dict(counts), attempts
+    )
+    if budget is not None and size > budget:
+        raise RuntimeError(
+            f"{output} 大小 {size / 1024**2:.2f} MB，超出预算 {budget / 1024**2:.2f} MB"
+            f"（{report}）"
+        )
+    return report
+
+
+@dataclass(frozen=True)
+class Export:
+    """
+    `save_all` 的一个输出。
+
+    ## Example:
+    ```python
+    Export("images/500hPa.svg", budget=2 * 1024**2)
+    Export("slides/500hPa.png", dpi=150)
+    Export("web/500hPa.jpg", width=480, options={"quality": 85})
+    ```
+    """
+
+    path: str
+    """输出路径，格式由扩展名决定"""
+    dpi: float | None = None
+    """位图格式为输出分辨率，默认同 `savefig`；矢量格式为栅格化图层的分辨率，默认为 `RASTER_DPI`"""
+    width: int | None = None
+    """位图的宽度（像素），指定时忽略 `dpi`，用于缩略图"""
+    budget: int | None = None
+    """矢量格式的文件大小上限，见 `save`"""
+    options: dict = field(default_factory=dict)
+    """矢量格式传给 `Figure.savefig`，位图格式传给 `PIL.Image.save`，例如 JPEG 的 `quality`"""
+
+    @property
+    def format(self) -> str:
+        return os.path.splitext(self.path)[1].lstrip(".").lower()
+
+    @property
+    def vector(self) -> bool:
+        return self.format in VECTOR_FORMATS
+
+
+def _render_rgba(fig: Figure, dpi: float) -> np.ndarray:
+    """
+    以 `dpi` 用 Agg 绘制一次整张图，返回 RGBA 像素。绘制后恢复图原来的画布与分辨率。
+    """
+    canvas, original_dpi = fig.canvas, fig.dpi
+    try:
+        agg = FigureCanvasAgg(fig)
+        fig.dpi = dpi
+        agg.draw()
+        return np.array(agg.buffer_rgba())
+    finally:
+        fig.dpi = original_dpi
+        fig.set_canvas(canvas)
+
+
+def _write_raster(rgba: np.ndarray, export: Export, size: tuple[int, int], dpi):
+    from PIL import Image
+
+    start = time.perf_counter()
+    image = Image.fromarray(rgba)
+    if image.size != size:
+        # Lanczos 缩小，文字和细线的抗锯齿效果接近直接以该分辨率绘制
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    if export.format in OPAQUE_FORMATS:
+        image = image.convert("RGB")
+    directory = os.path.dirname(export.path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    image.save(export.path, dpi=(dpi, dpi), **export.options)
+    return time.perf_counter() - start
+
+
+def save_all(
+    fig: Figure,
+    exports: Iterable[Export | str],
+    axes: Iterable[Axes] | None = None,
+    rasterize: Iterable[str] = RASTER_LAYERS,
+    threads: int | None = None,
+) -> list[SaveReport]:
+    """
+    把一张图保存为多种格式与分辨率，位图只绘制一次。
+
+    位图以各输出中最高的分辨率绘制一次，其余由 Pillow 缩小，在线程中编码写出；
+    矢量格式同时在当前线程中依次保存，栅格化策略同 `save`。位图输出不支持 `bbox_inches`，
+    图的布局应由 constrained layout 等方式确定。
+
+    :param fig: 要保存的图
+    :param exports: 输出，字符串视为使用默认参数的 `Export`
+    :param axes: 矢量格式中应用栅格化策略的坐标轴，见 `save`
+    :param rasterize: 矢量格式中栅格化的图层
+    :param threads: 编码位图的线程数，默认为位图输出的个数
+    :return: 与 `exports` 顺序相同的保存结果。位图的 `seconds` 只含缩放、编码与写入，
+        共用的绘制时间记在 `shared` 中
+
+    ## Example:
+    ```python
+    for report in save_all(
+        map.fig,
+        [
+            "images/500hPa.svg",
+            Export("slides/500hPa.png", dpi=150),
+            Export("web/500hPa.jpg", width=480),
+        ],
+    ):
+        print(report)
+    ```
+    """
+    exports = [Export(e) if isinstance(e, str) else e for e in exports]
+    rasters = [e for e in exports if not e.vector]
+    reports: dict[int, SaveReport] = {}
+
+    futures = {}
+    shared = 0.0
+    if rasters:
+        inches = fig.get_size_inches()
+        default = matplotlib.rcParams["savefig.dpi"]
+        default = fig.dpi if default == "figure" else default
+        dpis = [e.width / inches[0] if e.width else (e.dpi or default) for e in rasters]
+        start = time.perf_counter()
+        rgba = _render_rgba(fig, max(dpis))
+        shared = time.perf_counter() - start
+        pool = ThreadPoolExecutor(max_workers=threads or len(rasters))
+        for export, dpi in zip(rasters, dpis):
+            if export.width:
+                size = (export.width, round(export.width * inches[1] / inches[0]))
+            else:
+                # 与 Agg 画布尺寸的取整方式相同，最高分辨率的输出无需缩放
+                size = (int(inches[0] * dpi), int(inches[1] * dpi))
+            future = pool.submit(_write_raster, rgba, export, size, dpi)
+            futures[id(export)] = (future, dpi)
+        pool.shutdown(wait=False)
+
+    # 矢量格式与位图编码同时进行；Matplotlib 的绘制不是线程安全的，只能依次保存
+    for export in exports:
+        if export.vector:
+            directory = os.path.dirname(export.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            reports[id(export)] = save(
+                fig,
+                export.path,
+                axes=axes,
+                rasterize=rasterize,
+                dpi=export.dpi,
+                budget=export.budget,
+                **export.options,
+            )
+    for export in rasters:
+        future, dpi = futures[id(export)]
+        seconds = future.result()
+        reports[id(export)] = SaveReport(
+            export.path, os.path.getsize(export.path), seconds, dpi, shared=shared
+        )
+    return [reports[id(e)] for e in exports]
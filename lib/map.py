@@ -1,14 +1,20 @@
-from cartopy.io import shapereader
 import cartopy.crs as ccrs
 import matplotlib.pyplot as plt
-import cartopy.feature as cfeature
 from cartopy.mpl.geoaxes import GeoAxes
 import matplotlib
 from os import path
-from scipy.ndimage import gaussian_filter
+from typing import Callable, Iterable
 
 import numpy as np
-from xarray import Dataset
+import pandas as pd
+from xarray import DataArray, Dataset
+
+from . import export, natural_earth
+from .boundary import BoundaryFeature
+from .mesh import ProjectedGrid, projected_grid
+from .thinning import BARB_SPACING, thin_indices
+from .region import Extent, crop
+from .smooth import smoothed
 
 current_dir = path.dirname(__file__)
 
@@ -27,6 +33,7 @@ class Map:
         figsize=(10, 10),
         prj=ccrs.LambertConformal(central_longitude=105, central_latitude=35),
         location_color="yellow",
+        extent: Extent | None = None,
     ):
         """
         初始化地图对象。
@@ -35,6 +42,8 @@ class Map:
         :param figsize: 图形大小，默认为(10, 10)
         :param prj: 投影方式，默认为 Lambert Conformal 投影，需要时可改 ccrs.PlateCarree() 等
         :param location_color: 龙卷发生地标记颜色，默认为黄色
+        :param extent: 地图范围（西、东、南、北），默认为数据的范围。
+            指定时 `plot` 等方法先把数据裁剪到该范围再计算，见 `crop`
         """
         self.location_color = location_color
         self.fig, self.ax = plt.subplots(
@@ -44,6 +53,9 @@ class Map:
         )
         self.proj = prj
         self.data = data
+        self.extent = extent
+        if extent is not None:
+            self.ax.set_extent(extent, ccrs.PlateCarree())
         if hasattr(data, "variables") and data.variables.keys().__contains__("msl"):
             self.is_surface = True
         else:
@@ -112,6 +124,184 @@ class Map:
         self.draw_coastlines().draw_province().draw_guangzhou_city().draw_baiyun_district()
         return self
 
+    def crop(self, data=None, sigma: float | None = None):
+        """
+        把数据裁剪到地图范围，并按 `sigma` 留出平滑所需的边缘，见 `lib.region`。
+        未指定地图范围时原样返回。
+
+        :param data: 需要裁剪的数据，默认为 `self.data`
+        :param sigma: 之后要做的平滑的高斯核标准差
+        """
+        return crop(self.data if data is None else data, self.extent, sigma)
+
+    def projected(self, lon, lat) -> ProjectedGrid:
+        """
+        经纬度网格在地图投影下的坐标，按 (网格, 投影) 缓存，见 `lib.mesh`。
+
+        :param lon: 经度，一维或二维
+        :param lat: 纬度，维数与 `lon` 相同
+        """
+        return projected_grid(lon, lat, self.proj)
+
+    def on_grid(self, field: DataArray | Dataset) -> DataArray | Dataset:
+        """
+        为带有 `longitude`、`latitude` 坐标的数据加上投影坐标 `proj_x`、`proj_y`，不复制数据。
+        """
+        grid = self.projected(field["longitude"].values, field["latitude"].values)
+        dims = ("latitude", "longitude")
+        return field.assign_coords(proj_x=(dims, grid.x), proj_y=(dims, grid.y))
+
+    def contour(self, field: DataArray, **kwargs):
+        """
+        在投影坐标下绘制等值线，省去 Cartopy 对网格和路径的逐次变换。
+        参数同 `DataArray.plot.contour`，默认不添加坐标轴标签。
+        """
+        kwargs.setdefault("add_labels", False)
+        return self.on_grid(field).plot.contour(
+            x="proj_x", y="proj_y", ax=self.ax, transform=self.proj, **kwargs
+        )
+
+    def contourf(self, field: DataArray, **kwargs):
+        """
+        在投影坐标下绘制填色图。参数同 `DataArray.plot.contourf`，默认不添加坐标轴标签。
+        """
+        kwargs.setdefault("add_labels", False)
+        return self.on_grid(field).plot.contourf(
+            x="proj_x", y="proj_y", ax=self.ax, transform=self.proj, **kwargs
+        )
+
+    def vector_grid(self, data: Dataset) -> ProjectedGrid:
+        """
+        风场所在格点的投影坐标。`data` 可以是规则网格，也可以是 `thin` 选出的散点。
+        """
+        lon, lat = data["longitude"].values, data["latitude"].values
+        if data["longitude"].dims == data["latitude"].dims:
+            # 散点的经纬度一一对应，不能再组成网格
+            lon, lat = lon[np.newaxis], lat[np.newaxis]
+        return self.projected(lon, lat)
+
+    def thin(self, data: Dataset, spacing: float = BARB_SPACING) -> Dataset:
+        """
+        按屏幕间距从网格中选出绘制风羽的格点，见 `lib.thinning`。
+        使用当前的显示范围，应在绘制等值线或设置地图范围之后调用。
+
+        :param data: 规则经纬度网格上的数据集
+        :param spacing: 相邻风羽的屏幕间距，单位为点
+        :return: 沿 `point` 维度排列的散点数据集
+        """
+        self.ax.apply_aspect()
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        box = self.ax.get_window_extent()
+        iy, ix = thin_indices(
+            data["longitude"].values,
+            data["latitude"].values,
+            self.proj,
+            (x0, x1, y0, y1),
+            (box.width / self.fig.dpi, box.height / self.fig.dpi),
+            spacing,
+        )
+        return data.isel(
+            latitude=DataArray(iy, dims="point"), longitude=DataArray(ix, dims="point")
+        )
+
+    def barbs(self, data: Dataset, u: str, v: str, **kwargs):
+        """
+        在投影坐标下绘制风羽。风矢量按缓存的旋转系数转到投影坐标，与 Cartopy 的结果一致。
+
+        :param data: 包含风场的数据集，规则网格或 `thin` 选出的散点
+        :param u: 纬向风变量名
+        :param v: 经向风变量名
+        :param kwargs: 传给 `Axes.barbs` 的参数
+        """
+        grid = self.vector_grid(data)
+        u, v = grid.rotate(data[u].values, data[v].values)
+        return self.ax.barbs(grid.x, grid.y, u, v, transform=self.proj, **kwargs)
+
+    def streamplot(self, data: Dataset, u: str, v: str, **kwargs):
+        """
+        绘制流线，并把流线和箭头标记为 `"streamplot"` 图层，保存时可栅格化，见 `save`。
+
+        :param data: 规则经纬度网格上包含风场的数据集
+        :param u: 纬向风变量名
+        :param v: 经向风变量名
+        :param kwargs: 传给 `GeoAxes.streamplot` 的参数
+        """
+        patches = len(self.ax.patches)
+        sp = self.ax.streamplot(
+            x=data["longitude"].values,
+            y=data["latitude"].values,
+            u=data[u].values,
+            v=data[v].values,
+            transform=ccrs.PlateCarree(),
+            **kwargs,
+        )
+        # 箭头逐个加入坐标轴，不在 sp.arrows 中
+        export.tag([sp.lines, *self.ax.patches[patches:]], "streamplot")
+        return sp
+
+    def save(
+        self,
+        output: str,
+        rasterize: Iterable[str] = export.RASTER_LAYERS,
+        dpi: float | None = None,
+        budget: int | None = None,
+        **kwargs,
+    ) -> export.SaveReport:
+        """
+        保存地图。SVG 等矢量格式中，地图上的填色图、网格填色、流线以 `dpi` 栅格化，
+        文字、边界、等值线、风羽和色标保持矢量，文件更小、打开更快，见 `lib.export`。
+
+        :param output: 输出路径，格式由扩展名决定
+        :param rasterize: 栅格化的图层，为空时输出全矢量图
+        :param dpi: 栅格化图层的分辨率，默认为 `export.RASTER_DPI`
+        :param budget: 文件大小上限（字节），超出时降低分辨率重新保存，仍超出时报错
+        :param kwargs: 传给 `Figure.savefig` 的其他参数
+        :return: 文件大小、保存耗时等，可直接打印
+
+        ## Example:
+        ```python
+        print(map.save(f"images/{title}.svg", budget=2 * 1024**2))
+        ```
+        """
+        return export.save(
+            self.fig,
+            output,
+            axes=[self.ax],
+            rasterize=rasterize,
+            dpi=dpi,
+            budget=budget,
+            **kwargs,
+        )
+
+    def save_all(
+        self,
+        exports: Iterable[export.Export | str],
+        rasterize: Iterable[str] = export.RASTER_LAYERS,
+    ) -> list[export.SaveReport]:
+        """
+        一次保存多种格式与分辨率：位图只绘制一次，其余分辨率与缩略图由缩小得到，
+        与矢量格式同时写出，见 `lib.export.save_all`。
+
+        :param exports: 输出路径或 `export.Export`
+        :param rasterize: 矢量格式中栅格化的图层
+        :return: 各输出的文件大小与耗时
+
+        ## Example:
+        ```python
+        from lib.export import Export
+
+        map.save_all(
+            [
+                f"images/{title}.svg",
+                Export(f"slides/{title}.png", dpi=150),
+                Export(f"web/{title}.jpg", width=480),
+            ]
+        )
+        ```
+        """
+        return export.save_all(self.fig, exports, axes=[self.ax], rasterize=rasterize)
+
     def plot(
         self,
         time: str,
@@ -141,23 +331,40 @@ class Map:
         """
         绘制海平面天气图。绘制的内容包括海平面气压等高线和 10m 风场。
         """
-        data = self.data.sel(valid_time=time)
-        mslp = data["msl"]
-        mslp.values = gaussian_filter(mslp.values, sigma)
-        ctp = mslp.plot.contour(
+        self.draw_sf(self.prepare_sf(time, sigma))
+        return self.decorate_sf()
+
+    def prepare_sf(self, time: str, sigma=5) -> Dataset:
+        """
+        读取并处理一个时次的海平面数据：平滑海平面气压（见 `lib.smooth`）。不修改 `self.data`。
+        只读取和平滑该时次，数据按时间分块存储时只访问对应的块。
+        指定了地图范围时只处理范围内（含平滑边缘）的格点。
+        """
+        source = self.crop(sigma=sigma).sel(valid_time=time)
+        data = source[["u10", "v10"]].load()
+        data["msl_hpa"] = smoothed(source["msl_hpa"], sigma)
+        return data
+
+    def draw_sf(self, data: Dataset, target=None):
+        """
+        绘制海平面天气图随时间变化的部分：海平面气压等高线和 10m 风羽。
+
+        :param data: `prepare_sf` 的结果
+        :param target: 绘制到的对象，默认为地图本身，逐帧绘制时为 `MapTemplate`
+        """
+        target = target or self
+        ctp = target.contour(
+            data["msl_hpa"],
             extend="max",
             levels=np.arange(960, 1041, 2.5),
             # cbar_kwargs={"location": "bottom", "label": "Surface Pressure [hPa]"},
             # vmin=0,
             # vmax=100,
-            add_labels=False,
-            ax=self.ax,
-            transform=ccrs.PlateCarree(),
             linewidths=1.5,
             colors="black",
             # add_colorbar=False,
         )
-        self.ax.clabel(ctp, inline=True, fontsize=10, fmt="%2.1f")
+        target.clabel(ctp, inline=True, fontsize=10, fmt="%2.1f")
         # sp = data.plot.streamplot(
         #     x="longitude",
         #     y="latitude",
@@ -168,100 +375,213 @@ class Map:
         #     # color="k",
         #     # density=2,
         # )
-        datab = data.sel(
-            longitude=slice(None, None, 20),
-            latitude=slice(None, None, 20),
-        )
-        self.ax.barbs(
-            x=datab.longitude.values,
-            y=datab.latitude.values,
-            u=datab.u10.values,
-            v=datab.v10.values,
-            transform=ccrs.PlateCarree(),
+        target.barbs(
+            self.thin(data),
+            "u10",
+            "v10",
             barb_increments=dict(half=2, full=4, flag=20),
             sizes={"emptybarb": 0},
         )
+
+    def decorate_sf(self):
+        """
+        绘制海平面天气图中不随时间变化的部分：经纬网、图例、海洋和陆地。
+        """
         self.gridlines().barb_legend()
-        self.ax.add_feature(cfeature.OCEAN, linewidth=1.5, color="lightblue")
-        self.ax.add_feature(cfeature.LAND)
+        self.ax.add_feature(natural_earth.OCEAN, linewidth=1.5, color="lightblue")
+        self.ax.add_feature(natural_earth.LAND)
         return self
 
     def plot_gp(self, time: str, h: str, sigma=1, sigmaT=1):
         """
         绘制等压面天气图。绘制的内容包括等压面高度场、温度场和风速场。
         """
-        data = self.data.sel(valid_time=time, pressure_level=h)
+        self.draw_gp(self.prepare_gp(time, h, sigma, sigmaT), h)
+        self.gridlines().barb_legend()
+        return self
+
+    def prepare_gp(self, time: str, h: str, sigma=1, sigmaT=1) -> Dataset:
+        """
+        读取并处理一个时次、一个气压层的数据：计算风速、平滑高度场，并把温度换算为摄氏度（`t_celsius`）后平滑。
+        高度场和温度按该时次的全部气压层一次平滑并缓存（见 `lib.smooth`），绘制同一时次的其他层时直接选取。
+        不修改 `self.data`。指定了地图范围时只处理范围内（含平滑边缘）的格点。
+        """
+        source = self.crop(sigma=max(sigma or 0, sigmaT or 0)).sel(valid_time=time)
+        data = source[["u", "v"]].sel(pressure_level=h).load()
         data["wind_speed"] = np.sqrt(data["u"] ** 2 + data["v"] ** 2)
-        data["wind_speed"].plot.contourf(
+        data["z_dagpm"] = smoothed(source["z_dagpm"], sigma).sel(pressure_level=h)
+        data["t_celsius"] = smoothed(source["t"] - 273, sigmaT).sel(pressure_level=h)
+        return data
+
+    def _wind_speed_style(self, h: str) -> dict:
+        return dict(
             extend="max",
             levels=np.arange(15, 31, 3) if h == "500" else np.arange(6, 24, 3),
             cbar_kwargs={"location": "bottom", "label": "风速 [m/s]"},
             vmin=15,
             cmap="YlOrBr",
             # vmax=100,
-            add_labels=False,
-            ax=self.ax,
-            transform=ccrs.PlateCarree(),
             # add_colorbar=False
         )
-        datab = data.sel(
-            longitude=slice(None, None, 15),
-            latitude=slice(None, None, 15),
-        )
-        self.ax.barbs(
-            x=datab.longitude.values,
-            y=datab.latitude.values,
-            u=datab.u.values,
-            v=datab.v.values,
-            transform=ccrs.PlateCarree(),
+
+    def draw_gp(self, data: Dataset, h: str, target=None):
+        """
+        绘制等压面天气图随时间变化的部分：风速填色、风羽、高度场和温度场等值线。
+
+        :param data: `prepare_gp` 的结果
+        :param h: 气压层，决定风速的色阶
+        :param target: 绘制到的对象，默认为地图本身，逐帧绘制时为 `MapTemplate`（不添加色标）
+        """
+        target = target or self
+        target.contourf(data["wind_speed"], **self._wind_speed_style(h))
+        target.barbs(
+            self.thin(data),
+            "u",
+            "v",
             barb_increments=dict(half=2, full=4, flag=20),
             sizes={"emptybarb": 0},
         )
-        gpz = data["z"]
-        gpz.values = gaussian_filter(gpz.values, sigma)
-        ct = gpz.plot.contour(
+        ct = target.contour(
+            data["z_dagpm"],
             levels=np.arange(0, 1000, 4),
             linewidths=1.5,
-            transform=ccrs.PlateCarree(),
             colors="black",
         )
-        self.ax.clabel(ct, inline=True, fontsize=10, fmt="%1.0f")
-        celciusT = data["t"] - 273
-        celciusT.values = gaussian_filter(celciusT.values, sigmaT)
-        ctt = celciusT.plot.contour(
+        target.clabel(ct, inline=True, fontsize=10, fmt="%1.0f")
+        ctt = target.contour(
+            data["t_celsius"],
             levels=np.arange(-40, 41, 4),
-            transform=ccrs.PlateCarree(),
             colors="red",
             linestyles="solid",
         )
-        self.ax.clabel(ctt, inline=True, fontsize=10)
+        target.clabel(ctt, inline=True, fontsize=10)
+
+    def decorate_gp(self, data: Dataset, h: str):
+        """
+        绘制等压面天气图中不随时间变化的部分：经纬网、图例和风速色标。
+
+        :param data: 任一时次 `prepare_gp` 的结果，仅用于生成色标
+        :param h: 气压层
+        """
+        # 色标由 xarray 按色阶生成，与逐帧的填色图一致；生成后移除这一帧的填色图
+        self.contourf(data["wind_speed"], **self._wind_speed_style(h)).remove()
         self.gridlines().barb_legend()
         return self
 
+    def clabel(self, cs, **kwargs):
+        """
+        为等值线添加标注，参数同 `Axes.clabel`。
+        """
+        return self.ax.clabel(cs, **kwargs)
+
+    def animate(
+        self,
+        output: str,
+        start: str | None = None,
+        end: str | None = None,
+        h: str | None = None,
+        sigma: int | None = 1,
+        sigmaT: int | None = 1,
+        title: str | Callable[[pd.Timestamp], str] | None = None,
+        fps: float = 4,
+        prefetch: int = 2,
+    ):
+        """
+        把 `start` 到 `end` 之间每个时次的天气图（内容同 `plot`）逐帧写成动画。
+
+        海岸线、边界、色标等静态图层只绘制一次并缓存为背景（见 `lib.template`），每帧只绘制数据图层；
+        下一帧的数据在后台线程中提前准备（最多 `prefetch` 帧），帧画好后立即交给编码器，
+        不在内存中保留，因此内存占用与帧数无关。
+
+        :param output: 输出路径，按扩展名输出 MP4、GIF 或 APNG（`.png`/`.apng`），需要 ffmpeg；
+            路径中含有 `{}` 占位符时逐帧保存为图片序列，例如 `"images/500hPa/{:03d}.png"`
+        :param start: 起始时间（含），默认为数据的第一个时次
+        :param end: 结束时间（含），默认为数据的最后一个时次
+        :param h: 气压层，含义同 `plot`
+        :param sigma: 高度场或压力场平滑参数，同 `plot`
+        :param sigmaT: 温度场平滑参数，同 `plot`
+        :param title: 每帧的标题。字符串中可用 `{time}`、`{h}` 占位，也可以传入以时间为参数的函数
+        :param fps: 每秒帧数
+        :param prefetch: 后台最多提前准备的帧数
+        :return: 使用的 `MapTemplate`，可从中读取帧数和渲染速度
+
+        ## Example:
+        ```python
+        Map(geopotential_data).common().animate(
+            "images/500hPa.mp4",
+            "2024-04-26T00:00:00",
+            "2024-04-28T00:00:00",
+            "500",
+            sigma=5,
+            sigmaT=5,
+            title="{time:%Y-%m-%d %H:%M} UTC {h}hPa",
+        )
+        ```
+        """
+        from .animation import FrameWriter
+        from .animation import prefetch as prefetched
+        from .template import MapTemplate
+
+        if self.is_surface:
+            if h != None:
+                raise ValueError("Surface data does not have height")
+            prepare = lambda time: self.prepare_sf(time, sigma)
+            draw = lambda template, data: self.draw_sf(data, template)
+        else:
+            if h == None:
+                raise ValueError("Geopotential data requires height")
+            prepare = lambda time: self.prepare_gp(time, h, sigma, sigmaT)
+            draw = lambda template, data: self.draw_gp(data, h, template)
+        times = self.data["valid_time"].sel(valid_time=slice(start, end)).values
+        if len(times) == 0:
+            raise ValueError(f"{start} 至 {end} 之间没有数据")
+        if isinstance(title, str):
+            caption = lambda time, text=title: text.format(time=time, h=h)
+        else:
+            caption = title
+
+        with FrameWriter(output, fps) as writer:
+            frames = prefetched(
+                prepare, [pd.Timestamp(time) for time in times], prefetch
+            )
+            template = None
+            for time, data in frames:
+                if template is None:
+                    # 静态图层与标题占位在第一帧数据就绪后绘制，色标需要数据
+                    if self.is_surface:
+                        self.decorate_sf()
+                    else:
+                        self.decorate_gp(data, h)
+                    if caption is not None:
+                        self.title(caption(time), fontsize=20)
+                    template = MapTemplate(self)
+
+                def frame(template: MapTemplate):
+                    draw(template, data)
+                    if caption is not None:
+                        template.title(caption(time), fontsize=20)
+
+                writer.write(template.render(frame))
+        return template
+
     def draw_china(self):
         """
         绘制中国地图的边界。使用了中国行政区划的 shapefile 数据。
         """
-        cn_shape_path = path.join(
-            current_dir, "ChinaAdminDivisonSHP/1. Country/country.shp"
+        self.ax.add_feature(
+            BoundaryFeature("country", self.ax),
+            facecolor="none",
+            edgecolor="black",
+            # linewidths=0.5,
         )
-        cn_reader = shapereader.Reader(cn_shape_path)
-        for record in cn_reader.records():
-            self.ax.add_geometries(
-                [record.geometry],
-                ccrs.PlateCarree(),
-                facecolor="none",
-                edgecolor="black",
-                # linewidths=0.5,
-            )
         return self
 
     def draw_coastlines(self):
         """
-        绘制海岸线。使用 Cartopy 的内置海岸线特征。
+        绘制海岸线。使用预先裁剪的 Natural Earth 海岸线，见 `lib.natural_earth`。
         这将添加黑色的海岸线到地图上。
         """
-        self.ax.add_feature(cfeature.COASTLINE, edgecolor="black")
+        self.ax.add_feature(natural_earth.COASTLINE, edgecolor="black")
 
         return self
 
@@ -275,57 +595,36 @@ class Map:
             "香港特别行政区",
             "澳门特别行政区",
         ]
-        # pr_shape_path = "./ChinaAdminDivisonSHP/2. Province/province.shp"
-        pr_shape_path = path.join(
-            current_dir, "ChinaAdminDivisonSHP/2. Province/province.shp"
+        self.ax.add_feature(
+            BoundaryFeature("province", self.ax, [{"pr_name": pr} for pr in provinces]),
+            facecolor="none",
+            edgecolor="black",
         )
-        pr_reader = shapereader.Reader(pr_shape_path)
-        for record in pr_reader.records():
-            if record.attributes["pr_name"] in provinces:
-                self.ax.add_geometries(
-                    [record.geometry],
-                    ccrs.PlateCarree(),
-                    facecolor="none",
-                    edgecolor="black",
-                )
         return self
 
     def draw_guangzhou_city(self):
         """
         绘制广州市的边界。使用了中国行政区划的 shapefile 数据。
         """
-        ct_shape_path = path.join(current_dir, "ChinaAdminDivisonSHP/3. City/city.shp")
-        ct_reader = shapereader.Reader(ct_shape_path)
-        for record in ct_reader.records():
-            if record.attributes["ct_name"] == "广州市":
-                self.ax.add_geometries(
-                    [record.geometry],
-                    ccrs.PlateCarree(),
-                    facecolor="none",
-                    edgecolor="black",
-                )
+        self.ax.add_feature(
+            BoundaryFeature("city", self.ax, [{"ct_name": "广州市"}]),
+            facecolor="none",
+            edgecolor="black",
+        )
         return self
 
     def draw_baiyun_district(self):
         """
         绘制广州市白云区的边界。使用了中国行政区划的 shapefile 数据。
         """
-        dt_shape_path = path.join(
-            current_dir, "ChinaAdminDivisonSHP/4. District/district.shp"
+        self.ax.add_feature(
+            # 同时按市名筛选，避免与其他城市的同名区混淆
+            BoundaryFeature(
+                "district", self.ax, [{"ct_name": "广州市", "dt_name": "白云区"}]
+            ),
+            facecolor="none",
+            edgecolor="black",
         )
-        dt_reader = shapereader.Reader(dt_shape_path)
-        for record in dt_reader.records():
-            if (
-                record.attributes["ct_name"]
-                == "广州市"  # To avoid confusion with other cities
-                and record.attributes["dt_name"] == "白云区"
-            ):
-                self.ax.add_geometries(
-                    [record.geometry],
-                    ccrs.PlateCarree(),
-                    facecolor="none",
-                    edgecolor="black",
-                )
         return self
 
     def draw_tornado_location(self, add_legend=False):
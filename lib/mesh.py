@@ -0,0 +1,108 @@
+"""
+经纬度网格在地图投影下的坐标缓存。
+
+每次以 `transform=ccrs.PlateCarree()` 绘制等值线或风羽时，Cartopy 都要把整个经纬度网格和生成的每条路径
+重新变换到地图投影。同一网格在同一投影下的坐标是固定的，这里按 (网格, 投影) 只计算一次，
+之后直接在投影坐标下绘图。风矢量的旋转也按网格缓存，每帧只需一次线性组合。
+"""
+
+import hashlib
+from dataclasses import dataclass
+from threading import Lock
+
+import cartopy.crs as ccrs
+import numpy as np
+
+
+@dataclass(frozen=True)
+class ProjectedGrid:
+    """
+    经纬度网格在某一投影下的坐标，以及把经纬度方向的矢量旋转到投影坐标所需的系数。
+    """
+
+    x: np.ndarray
+    """投影坐标 x，形状与二维网格相同"""
+    y: np.ndarray
+    """投影坐标 y"""
+    east: tuple[np.ndarray, np.ndarray]
+    """经度方向单位增量在投影坐标下的分量"""
+    north: tuple[np.ndarray, np.ndarray]
+    """纬度方向单位增量在投影坐标下的分量"""
+
+    def rotate(self, u: np.ndarray, v: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        把经纬度方向的矢量分量旋转到投影坐标下，保持矢量长度不变。
+        与 `Projection.transform_vectors(ccrs.PlateCarree(), ...)` 的结果一致。
+        """
+        x = u * self.east[0] + v * self.north[0]
+        y = u * self.east[1] + v * self.north[1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scale = np.hypot(u, v) / np.hypot(x, y)
+        scale = np.where(np.isfinite(scale), scale, 0)
+        return x * scale, y * scale
+
+
+# 计算旋转系数时经纬度的差分步长，单位为度
+_STEP = 1e-4
+
+_grids: dict[tuple, ProjectedGrid] = {}
+_lock = Lock()
+
+
+def grid_key(
+    lon: np.ndarray, lat: np.ndarray, prj: ccrs.Projection | None = None
+) -> tuple:
+    """
+    (网格, 投影) 的缓存键，网格按内容计算摘要。与投影无关的缓存（如 `lib.region`）不传 `prj`。
+    """
+    digest = hashlib.sha1()
+    for array in (lon, lat):
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest(), prj.proj4_init if prj is not None else None
+
+
+def projected_grid(lon, lat, prj: ccrs.Projection) -> ProjectedGrid:
+    """
+    经纬度网格在 `prj` 下的坐标，按 (网格, 投影) 在进程内缓存。
+
+    :param lon: 经度，一维（规则网格）或二维（如 WRF 的 XLONG）
+    :param lat: 纬度，维数与 `lon` 相同
+    :param prj: 地图投影
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    key = grid_key(lon, lat, prj)
+    grid = _grids.get(key)
+    if grid is not None:
+        return grid
+    if lon.ndim == 1:
+        lon, lat = np.meshgrid(lon, lat)
+    source = ccrs.PlateCarree()
+
+    def project(lon, lat):
+        points = prj.transform_points(source, lon, lat)
+        return points[..., 0], points[..., 1]
+
+    x, y = project(lon, lat)
+    ex, ey = project(lon + _STEP, lat)
+    nx, ny = project(lon, lat + _STEP)
+    # 与 Cartopy 的 transform_vectors 相同，在纬度接近极点时向南差分
+    flip = lat + _STEP > 90
+    nx = np.where(flip, x - project(lon, lat - _STEP)[0], nx - x)
+    ny = np.where(flip, y - project(lon, lat - _STEP)[1], ny - y)
+    grid = ProjectedGrid(x, y, (ex - x, ey - y), (nx, ny))
+    for array in (grid.x, grid.y, *grid.east, *grid.north):
+        array.flags.writeable = False
+    with _lock:
+        _grids[key] = grid
+    return grid
+
+
+def clear_cache():
+    """
+    丢弃已缓存的投影坐标。
+    """
+    with _lock:
+        _grids.clear()
@@ -0,0 +1,227 @@
+"""
+MICAPS 解析结果的持久缓存。
+
+MICAPS 资料下发后不会再改动，因此解析得到的 DataFrame 以 Parquet 格式保存在缓存目录中，
+由 (路径, 字节数, 修改时间, 编码, 读取函数) 确定缓存键。命中时以内存映射方式读取列式文件，
+不再解析文本；缓存总大小超过上限时按最近最少使用的顺序淘汰。
+
+缓存会被多个进程同时使用（`read_micaps_batch` 与 `lib.batch` 的进程池），因此没有共享的索引文件：
+每个条目是一个 `<键>.parquet` 文件和一个记录来源的 `<键>.json` 文件，均先写入唯一的临时文件再原子地重命名；
+最近使用时间即 Parquet 文件的修改时间，命中时只更新该时间。淘汰时直接扫描缓存目录，
+不会因为某个进程写坏索引而遗漏文件。
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Callable, Iterable
+
+import pandas as pd
+
+from .read_micaps import columns
+
+# 默认缓存目录与大小上限
+CACHE_DIR = os.path.join(os.path.dirname(__file__), ".micaps_cache")
+MAX_BYTES = 1024 * 1024 * 1024
+
+# 超过这个时间（秒）仍未完成的临时文件视为写入进程已中断，淘汰时一并删除
+STALE_TMP_SECONDS = 3600
+
+
+class ParquetCache:
+    """
+    以 Parquet 文件保存解析结果的缓存，可由多个线程、进程同时使用。
+
+    ## Example:
+    ```python
+    from lib.micaps_cache import ParquetCache
+    from nmc_met_io.read_micaps import read_micaps_5
+
+    cache = ParquetCache("cache", max_bytes=256 * 1024 * 1024)
+    df = cache.read("TLOGP/20240427080000.000", read_micaps_5, encoding=None)
+    ```
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        """
+        :param directory: 缓存目录，不存在时自动创建
+        :param max_bytes: 缓存文件总字节数的上限
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(fname: str, encoding: str | None, reader: str) -> str:
+        """
+        源文件的缓存键。文件被替换或修改后字节数或修改时间随之变化，旧的缓存自然失效。
+        """
+        stat = os.stat(fname)
+        payload = json.dumps(
+            [os.path.abspath(fname), stat.st_size, stat.st_mtime_ns, encoding, reader]
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _replace(self, target: str, write: Callable[[str], None]):
+        # 每个写入者使用自己的临时文件，写完后原子地重命名，其他进程只会看到完整的文件
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _evict(self):
+        files = []
+        for cached in glob.glob(os.path.join(self.directory, "*.parquet")):
+            try:
+                stat = os.stat(cached)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, cached))
+        total = sum(size for _, size, _ in files)
+        for _, size, cached in sorted(files):
+            if total <= self.max_bytes:
+                break
+            for path in (cached, cached[: -len(".parquet")] + ".json"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        now = time.time()
+        for tmp in glob.glob(os.path.join(self.directory, "*.tmp")):
+            try:
+                if now - os.path.getmtime(tmp) > STALE_TMP_SECONDS:
+                    os.remove(tmp)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _check_columns(available: Iterable[str], columns: list[str] | None, fname):
+        missing = [c for c in columns or () if c not in available]
+        if missing:
+            raise KeyError(f"{fname} 中没有这些列：{missing}")
+
+    def read(
+        self,
+        fname: str,
+        parse: Callable[..., pd.DataFrame | None],
+        encoding: str | None = "gb18030",
+        columns: Iterable[str] | None = None,
+    ) -> pd.DataFrame | None:
+        """
+        读取 `fname` 的解析结果。缓存命中时直接读取 Parquet 文件，否则调用 `parse` 解析并写入缓存。
+
+        :param fname: MICAPS 文件路径
+        :param parse: 解析函数，以 `parse(fname)` 或 `parse(fname, encoding)` 的形式调用
+        :param encoding: 文件编码，为 None 时不传给 `parse`
+        :param columns: 只读取这些列，默认读取全部列；有不存在的列时，无论是否命中都抛出 `KeyError`
+        :return: 解析结果；`parse` 返回 None（文件无法解析）时返回 None，且不写入缓存
+        """
+        import pyarrow.parquet as pq
+
+        reader = f"{parse.__module__}.{parse.__qualname__}"
+        key = self.key(fname, encoding, reader)
+        columns = None if columns is None else list(columns)
+        cached = os.path.join(self.directory, key + ".parquet")
+        try:
+            self._check_columns(pq.read_schema(cached).names, columns, fname)
+            df = pd.read_parquet(cached, columns=columns, memory_map=True)
+        except (OSError, ValueError):
+            # 未缓存、已被其他进程淘汰或文件损坏（pyarrow 对损坏的文件抛出 ValueError 的子类），重新解析
+            pass
+        else:
+            try:
+                # 修改时间即最近使用时间，不需要改写其他文件
+                os.utime(cached)
+            except FileNotFoundError:
+                pass
+            return df
+
+        df = parse(fname) if encoding is None else parse(fname, encoding)
+        if df is None:
+            return None
+        entry = {
+            "source": os.path.abspath(fname),
+            "encoding": encoding,
+            "reader": reader,
+        }
+
+        def write_entry(tmp: str):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, indent=2)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._replace(cached, df.to_parquet)
+            self._replace(os.path.join(self.directory, key + ".json"), write_entry)
+            self._evict()
+        except OSError:
+            # 目录不可写时只是失去加速，不影响读取
+            pass
+        # 先写入缓存再检查列，下次读取其他列时不必重新解析
+        self._check_columns(df.columns, columns, fname)
+        return df if columns is None else df[columns]
+
+    def clear(self):
+        """
+        删除全部缓存文件。
+        """
+        for pattern in ("*.parquet", "*.json", "*.tmp"):
+            for path in glob.glob(os.path.join(self.directory, pattern)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+_default_cache: ParquetCache | None = None
+
+
+def default_cache() -> ParquetCache:
+    """
+    进程内共享的默认缓存，目录为 `CACHE_DIR`。
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ParquetCache()
+    return _default_cache
+
+
+def cached_read_micaps(
+    fname: str,
+    encoding="gb18030",
+    usecols: Iterable[int] | None = None,
+    cache: ParquetCache | None = None,
+) -> pd.DataFrame:
+    """
+    带缓存的 `lib.read_micaps.read_micaps`，可指定缓存。`read_micaps` 默认已使用 `default_cache()`。
+
+    参数同 `read_micaps`，`cache` 默认为 `default_cache()`。
+    """
+    from .read_micaps import _parse_frame
+
+    cache = cache or default_cache()
+    names = None if usecols is None else [columns.get(c, str(c)) for c in usecols]
+    return cache.read(fname, _parse_frame, encoding, names)
+
+
+def cached_read_micaps_5(
+    fname: str, cache: ParquetCache | None = None
+) -> pd.DataFrame | None:
+    """
+    带缓存的 `nmc_met_io.read_micaps.read_micaps_5`（第 5 类 TLOGP 探空资料）。
+
+    :param fname: 文件路径
+    :param cache: 默认为 `default_cache()`
+    """
+    from nmc_met_io.read_micaps import read_micaps_5
+
+    cache = cache or default_cache()
+    return cache.read(fname, read_micaps_5, encoding=None)
@@ -0,0 +1,159 @@
+"""
+随仓库分发的 Natural Earth 海岸线、陆地与海洋要素。
+
+`cartopy.feature.COASTLINE` 等要素第一次使用时需要联网下载 Natural Earth 数据，之后每张图还要重新解析 shapefile。
+这里预先把这些要素裁剪到项目常用的范围（`DOMAIN`），以 `lib.boundary` 相同的 WKB Parquet 格式保存在
+`lib/.natural_earth_store` 目录下，绘图时从进程内缓存读取，无需联网，也不重复解析。
+
+地图范围超出 `DOMAIN`，或尚未生成裁剪文件时，退回 cartopy 自带的要素（首次使用时需要联网下载）。
+
+裁剪文件需要在联网环境下运行 `python -m lib.natural_earth` 生成（从 cartopy 的缓存目录读取，没有时自动下载），
+并随仓库提交。
+"""
+
+import sys
+from os import path
+from threading import Lock
+
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+import numpy as np
+import shapely
+from cartopy.io import shapereader
+
+from .boundary import BoundaryLayer
+
+current_dir = path.dirname(__file__)
+
+DATA_DIR = path.join(current_dir, ".natural_earth_store")
+
+DOMAIN = (20.0, 180.0, -10.0, 75.0)
+"""裁剪范围（西、东、南、北）。兰伯特投影下 60°–140°E、10°–60°N 的地图四角对应约 29°–171°E、1°–66°N，
+cartopy 按这个经纬度范围请求要素，因此裁剪范围要比数据范围大得多"""
+
+SCALES = ("110m", "50m", "10m")
+"""由粗到细的分辨率，与 cartopy 自动选择分辨率时的候选相同"""
+
+FEATURES = {
+    "coastline": ("physical", cfeature.COASTLINE),
+    "land": ("physical", cfeature.LAND),
+    "ocean": ("physical", cfeature.OCEAN),
+}
+"""要素名到 (Natural Earth 类别, 对应的 cartopy 要素) 的映射"""
+
+
+def data_path(name: str, scale: str) -> str:
+    """
+    要素 `name` 在分辨率 `scale` 下的裁剪文件路径。
+    """
+    return path.join(DATA_DIR, f"{name}_{scale}.parquet")
+
+
+_layers: dict[tuple[str, str], BoundaryLayer] = {}
+_lock = Lock()
+
+
+def layer(name: str, scale: str) -> BoundaryLayer | None:
+    """
+    读取裁剪文件，在整个进程内复用。文件不存在时返回 None。
+    """
+    key = (name, scale)
+    if key not in _layers:
+        with _lock:
+            if key not in _layers:
+                source = data_path(name, scale)
+                _layers[key] = (
+                    BoundaryLayer.from_store(source) if path.exists(source) else None
+                )
+    return _layers[key]
+
+
+def _within(extent, domain=DOMAIN) -> bool:
+    x0, x1, y0, y1 = extent
+    west, east, south, north = domain
+    return west <= x0 and x1 <= east and south <= y0 and y1 <= north
+
+
+class VendoredFeature(cfeature.Feature):
+    """
+    从裁剪文件读取的 Natural Earth 要素，绘图参数和分辨率的选择与对应的 cartopy 要素一致。
+    """
+
+    def __init__(self, name: str, **kwargs):
+        """
+        :param name: 要素名，见 `FEATURES`
+        :param kwargs: 绘图参数，默认与对应的 cartopy 要素相同
+        """
+        _, self.fallback = FEATURES[name]
+        super().__init__(ccrs.PlateCarree(), **{**self.fallback.kwargs, **kwargs})
+        self.name = name
+        self.scaler = self.fallback.scaler
+
+    def _layer(self, scale: str) -> BoundaryLayer | None:
+        # 优先使用所需的分辨率，没有时使用已有的最细分辨率
+        found = layer(self.name, scale)
+        if found is not None:
+            return found
+        for candidate in reversed(SCALES):
+            found = layer(self.name, candidate)
+            if found is not None:
+                return found
+        return None
+
+    def geometries(self):
+        vendored = self._layer(self.scaler.scale)
+        if vendored is None:
+            return self.fallback.geometries()
+        return iter(vendored.select())
+
+    def intersecting_geometries(self, extent):
+        if extent is None or not _within(extent):
+            return self.fallback.intersecting_geometries(extent)
+        vendored = self._layer(self.scaler.scale_from_extent(extent))
+        if vendored is None:
+            return self.fallback.intersecting_geometries(extent)
+        return iter(vendored.select(extent=extent))
+
+
+COASTLINE = VendoredFeature("coastline")
+LAND = VendoredFeature("land")
+OCEAN = VendoredFeature("ocean")
+
+
+def build(scales=SCALES, domain=DOMAIN) -> list[str]:
+    """
+    从 Natural Earth 数据生成裁剪文件，返回写出的文件路径。cartopy 缓存目录中没有数据时会联网下载。
+    默认生成全部分辨率，区域图缩放到 10m 时与 cartopy 自动选择的分辨率一致。
+
+    :param scales: 需要生成的分辨率
+    :param domain: 裁剪范围（西、东、南、北）
+    """
+    west, east, south, north = domain
+    written = []
+    for name, (category, _) in FEATURES.items():
+        for scale in scales:
+            reader = shapereader.Reader(
+                shapereader.natural_earth(scale, category, name)
+            )
+            geometries = shapely.clip_by_rect(
+                np.array(list(reader.geometries()), dtype=object),
+                west,
+                south,
+                east,
+                north,
+            )
+            reader.close()
+            geometries = geometries[~shapely.is_empty(geometries)]
+            clipped = BoundaryLayer(
+                [{} for _ in geometries],
+                shapely.bounds(geometries).reshape(-1, 4),
+                list(shapely.to_wkb(geometries)),
+            )
+            clipped.save(data_path(name, scale))
+            written.append(data_path(name, scale))
+    return written
+
+
+if __name__ == "__main__":
+    for written in build(sys.argv[1:] or SCALES):
+        print(f"{written}: {path.getsize(written) / 1024:.0f} KiB")
@@ -1,5 +1,15 @@
-import ast
+import functools
+import glob
+import itertools
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Iterable
+import numpy as np
 import pandas as pd
+import polars as pl
 
 columns = {
     1: "lon",
@@ -89,15 +99,256 @@ columns = {
 }
 
 
-def read_micaps(fname: str, encoding="gb18030") -> pd.DataFrame:
-    txt = (
-        open(fname, "r", encoding=encoding)
-        .read()
-        .strip()
-        .splitlines()[5]
-        .replace("=", ":")
+# 站点块 `站号={代码=值,...}`，值可能是数字或带引号的字符串
+_STATION = re.compile(r"""\s*,?\s*([^\s={},]+)\s*=\s*\{([^{}]*)\}""")
+_INT = re.compile(r"[+-]?\d+")
+
+
+def _data_line(fname: str, encoding: str) -> str:
+    # 与 `.strip().splitlines()[5]` 等价，但只读到数据行为止
+    with open(fname, "r", encoding=encoding) as f:
+        lines = itertools.dropwhile(lambda line: not line.strip(), f)
+        line = next(itertools.islice(lines, 5, None), None)
+    if line is None:
+        raise ValueError(f"{fname} has no data line")
+    return line
+
+
+def _unclosed(value: str) -> bool:
+    value = value.strip()
+    return value[:1] in ("'", '"') and (len(value) < 2 or value[-1] != value[0])
+
+
+def _split_items(body: str):
+    # 按逗号切分 `代码=值` 条目；带引号的字符串中可能含有逗号，遇到未闭合的引号时与后续片段拼接
+    pending = None
+    for piece in body.split(","):
+        if pending is not None:
+            pending += "," + piece
+            if not _unclosed(pending.partition("=")[2]):
+                yield pending.partition("=")[::2]
+                pending = None
+            continue
+        code, _, value = piece.partition("=")
+        if _unclosed(value):
+            pending = piece
+            continue
+        yield code, value
+
+
+@functools.lru_cache(maxsize=32)
+def _wanted_items(codes: tuple[str, ...]) -> re.Pattern:
+    # 只匹配所需要素的 `代码=值` 条目，其余条目由正则引擎跳过，不在 Python 中逐个切分。
+    # 第二个分支整体跳过其他要素的带引号的值，避免把字符串中的 `,代码=` 误认为条目
+    wanted = "|".join(re.escape(code) for code in codes)
+    return re.compile(
+        rf"""(?:^|,)\s*(?:({wanted})\s*=\s*("[^"]*"|'[^']*'|[^,]*)"""
+        rf"""|[^,=]*=\s*(?:"[^"]*"|'[^']*'))"""
+    )
+
+
+def _station_id(token: str):
+    if token[0] in "\"'":
+        return token[1:-1]
+    return int(token) if _INT.fullmatch(token) else token
+
+
+def _column(tokens: list[str | None]) -> np.ndarray:
+    if any(t is not None and t[:1] in ("'", '"') for t in tokens):
+        return np.array(
+            [None if t is None else t.strip("'\"") for t in tokens], dtype=object
+        )
+    if None not in tokens and all(_INT.fullmatch(t) for t in tokens):
+        return np.array(tokens, dtype=np.int64)
+    return np.array(["nan" if t is None else t for t in tokens], dtype=np.float64)
+
+
+def parse_micaps(
+    fname: str, encoding="gb18030", usecols: Iterable[int] | None = None
+) -> tuple[np.ndarray, dict[int, np.ndarray]]:
+    """
+    解析 MICAPS 站点文件的数据行，返回站号数组与按要素代码组织的列。
+
+    :param fname: 文件路径
+    :param encoding: 文件编码
+    :param usecols: 需要的要素代码（见 `columns`），例如 `[401, 601, 801]`。只切分这些要素的条目，
+        其他要素由正则表达式跳过。默认解析全部要素
+    """
+    wanted = None if usecols is None else _wanted_items(tuple(map(str, usecols)))
+    line = _data_line(fname, encoding)
+    stations = []
+    values: dict[str, list[str | None]] = {}
+    for n, block in enumerate(_STATION.finditer(line)):
+        stations.append(_station_id(block.group(1)))
+        if wanted is None:
+            items = _split_items(block.group(2))
+        else:
+            items = (m.groups() for m in wanted.finditer(block.group(2)) if m[1])
+        for code, value in items:
+            code = code.strip()
+            if not code:
+                continue
+            column = values.get(code)
+            if column is None:
+                column = values[code] = [None] * n
+            if len(column) > n:
+                # 同一站点重复出现的要素，与字典字面量一样以最后一次为准
+                column[n] = value.strip()
+            else:
+                column.append(value.strip())
+        for column in values.values():
+            if len(column) <= n:
+                column.append(None)
+    return np.array(stations), {int(code): _column(v) for code, v in values.items()}
+
+
+def read_micaps(
+    fname: str,
+    encoding="gb18030",
+    usecols: Iterable[int] | None = None,
+    cache: bool = True,
+) -> pd.DataFrame:
+    """
+    读取 MICAPS 站点文件，返回以站号为索引的 DataFrame，列名按 `columns` 转换，
+    `columns` 中没有的要素代码以字符串作为列名。
+
+    默认通过 `lib.micaps_cache.default_cache()` 读取：同一文件第二次读取时直接读 Parquet 缓存，不再解析文本。
+    缓存中保存全部要素，`usecols` 只决定返回哪些列。
+
+    :param fname: 文件路径
+    :param encoding: 文件编码
+    :param usecols: 需要的要素代码，例如 `[401, 601, 801]`，文件中没有其中的要素时抛出 `KeyError`。默认返回全部要素
+    :param cache: 为 False 时不读写缓存，直接解析文件
+    """
+    names = None if usecols is None else [columns.get(c, str(c)) for c in usecols]
+    if cache:
+        from .micaps_cache import default_cache
+
+        return default_cache().read(fname, _parse_frame, encoding, names)
+    df = _parse_frame(fname, encoding, usecols)
+    missing = [name for name in names or () if name not in df.columns]
+    if missing:
+        raise KeyError(f"{fname} 中没有这些列：{missing}")
+    return df if names is None else df[names]
+
+
+def _parse_frame(
+    fname: str, encoding="gb18030", usecols: Iterable[int] | None = None
+) -> pd.DataFrame:
+    # 缓存中的解析函数，Parquet 只接受字符串列名
+    stations, data = parse_micaps(fname, encoding, usecols)
+    return pd.DataFrame(
+        {columns.get(code, str(code)): values for code, values in data.items()},
+        index=stations,
+    )
+
+
+# 文件名中的观测时刻，例如 `20240427080000.000`、`2024042708.000`、`24042708.000`
+_FILE_TIME = re.compile(r"(\d{14}|\d{10}|\d{8})(?:\.\d+)?$")
+_TIME_FORMATS = {14: "%Y%m%d%H%M%S", 10: "%Y%m%d%H", 8: "%y%m%d%H"}
+
+
+def micaps_time(fname: str) -> datetime:
+    """
+    由 MICAPS 文件名解析观测时刻。
+
+    :param fname: 文件路径，文件名形如 `20240427080000.000`
+    """
+    match = _FILE_TIME.search(os.path.basename(fname))
+    if match is None:
+        raise ValueError(f"cannot parse time from file name {fname}")
+    stamp = match.group(1)
+    return datetime.strptime(stamp, _TIME_FORMATS[len(stamp)])
+
+
+def micaps_files(source: str | Iterable[str]) -> list[str]:
+    """
+    展开目录、通配符或文件列表，返回按文件名排序的 MICAPS 文件路径。
+
+    :param source: 目录、通配符（例如 `"SURFACE/*.000"`）或文件路径列表
+    """
+    if not isinstance(source, str):
+        return sorted(source, key=os.path.basename)
+    if os.path.isdir(source):
+        source = os.path.join(source, "*")
+    files = [f for f in glob.glob(source) if os.path.isfile(f)]
+    return sorted(files, key=os.path.basename)
+
+
+def _read_frame(args: tuple[str, str, Iterable[int] | None]) -> pl.DataFrame:
+    # 进程池中执行，只返回列式数据，避免在进程间传递 pandas 对象
+    fname, encoding, usecols = args
+    stations, data = parse_micaps(fname, encoding, usecols)
+    return pl.DataFrame(
+        {
+            "station": stations.astype(str),
+            "time": pl.Series([micaps_time(fname)] * len(stations)),
+            **{columns.get(code, str(code)): values for code, values in data.items()},
+        }
     )
-    data_dict = ast.literal_eval(txt)
-    df = pd.DataFrame.from_dict(data_dict, orient="index")
-    df.rename(columns=columns, inplace=True)
-    return df
+
+
+def _bounded_map(pool: ProcessPoolExecutor, fn, items: list, window: int):
+    # 与 `pool.map` 相同，但同时最多只有 `window` 个任务在执行或等待取走，结果不会在内存中堆积
+    pending = deque()
+    items = iter(items)
+    for item in itertools.islice(items, window):
+        pending.append(pool.submit(fn, item))
+    while pending:
+        result = pending.popleft().result()
+        for item in itertools.islice(items, 1):
+            pending.append(pool.submit(fn, item))
+        yield result
+
+
+def read_micaps_batch(
+    source: str | Iterable[str],
+    encoding="gb18030",
+    usecols: Iterable[int] | None = None,
+    processes: int | None = None,
+    output: str | None = None,
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    在进程池中并行读取一批 MICAPS 站点文件，拼接为以 (站号, 时刻) 为键的 Polars 表，列名按 `columns` 转换。
+    观测时刻由文件名解析，见 `micaps_time`。
+
+    给出 `output` 时每个文件解析后立即写成 `output` 目录下的一个 Parquet 分片，内存中最多只保留
+    与进程数相当的若干文件，返回扫描这些分片的 LazyFrame；否则返回整张 DataFrame。
+
+    ## Example:
+    ```python
+    import polars as pl
+    from lib.read_micaps import read_micaps_batch
+
+    table = read_micaps_batch("SURFACE/*.000", usecols=[401, 601, 801], output="surface.parquet")
+    table.filter(pl.col("station") == "59287").collect()
+    ```
+
+    :param source: 目录、通配符或文件路径列表
+    :param encoding: 文件编码
+    :param usecols: 需要的要素代码，例如 `[401, 601, 801]`。默认解析全部要素
+    :param processes: 进程数，默认为 CPU 核数
+    :param output: Parquet 分片的输出目录。默认不写文件，直接在内存中拼接
+    """
+    files = micaps_files(source)
+    if not files:
+        raise FileNotFoundError(f"no MICAPS files found in {source}")
+    usecols = None if usecols is None else tuple(usecols)
+    tasks = [(f, encoding, usecols) for f in files]
+    window = 2 * (processes or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(processes) as pool:
+        frames = _bounded_map(pool, _read_frame, tasks, window)
+        if output is None:
+            table = pl.concat(list(frames), how="diagonal_relaxed")
+            return table.sort("station", "time")
+        os.makedirs(output, exist_ok=True)
+        parts = []
+        for fname, frame in zip(files, frames):
+            part = os.path.join(output, os.path.basename(fname) + ".parquet")
+            frame.write_parquet(part)
+            parts.append(part)
+
+    # 各文件的要素可能不同，逐个扫描后按列名对齐
+    scans = [pl.scan_parquet(part) for part in parts]
+    return pl.concat(scans, how="diagonal_relaxed").sort("station", "time")
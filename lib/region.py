@@ -0,0 +1,96 @@
+"""
+按地图范围裁剪数据。
+
+ERA5 数据下载的是 60°–140°E、10°–60°N 的整个区域，区域图只显示其中很小的一块。
+`crop` 先用下标切片把数据裁剪到地图范围，再进行平滑、风速等计算，而不是对整个区域计算后只显示一角。
+
+平滑需要用到范围外的格点，因此范围四周多留 `halo(sigma)` 个格点，裁剪后的平滑结果在地图范围内
+与对整个区域平滑的结果相同。各 (网格, 范围) 对应的下标区间在进程内缓存。
+"""
+
+import math
+from threading import Lock
+
+import numpy as np
+
+from .mesh import grid_key
+
+Extent = tuple[float, float, float, float]
+"""地图范围（西、东、南、北），单位为度"""
+
+_windows: dict[tuple, tuple[slice, slice]] = {}
+_lock = Lock()
+
+
+def halo(sigma: float | None) -> int:
+    """
+    平滑所需的额外格点数。`gaussian_filter` 的核半径为 `int(4 * sigma + 0.5)`，这里再多留一格。
+
+    :param sigma: 高斯核标准差，单位为格点；为 0 或 None 时不需要额外格点
+    """
+    return math.ceil(4 * sigma) + 1 if sigma else 0
+
+
+def _window(coord: np.ndarray, low: float, high: float, pad: int) -> slice:
+    # 坐标可以是升序或降序（ERA5 的纬度从北到南），取范围内格点的首尾下标再向两侧扩展
+    inside = np.flatnonzero((coord >= low) & (coord <= high))
+    if inside.size == 0:
+        raise ValueError(
+            f"范围 {low}–{high} 内没有格点，数据范围为 {coord.min()}–{coord.max()}"
+        )
+    return slice(
+        int(max(inside[0] - pad, 0)), int(min(inside[-1] + pad + 1, coord.size))
+    )
+
+
+def index_window(lon, lat, extent: Extent, pad: int = 0) -> tuple[slice, slice]:
+    """
+    经纬度网格中覆盖 `extent` 并向外扩展 `pad` 个格点的下标区间，按 (网格, 范围, pad) 缓存。
+
+    :param lon: 一维经度
+    :param lat: 一维纬度
+    :param extent: 地图范围（西、东、南、北）
+    :param pad: 四周额外保留的格点数
+    :return: (纬度切片, 经度切片)
+    """
+    lon = np.asarray(lon)
+    lat = np.asarray(lat)
+    key = (grid_key(lon, lat), tuple(map(float, extent)), pad)
+    window = _windows.get(key)
+    if window is None:
+        west, east, south, north = extent
+        window = (_window(lat, south, north, pad), _window(lon, west, east, pad))
+        with _lock:
+            _windows[key] = window
+    return window
+
+
+def crop(data, extent: Extent | None, sigma: float | None = None):
+    """
+    把带 `longitude`、`latitude` 维度的数据裁剪到 `extent`，并按 `sigma` 留出平滑所需的边缘。
+    使用下标切片，结果是原数据的视图，dask 上的数据仍保持惰性。
+
+    :param data: xarray Dataset 或 DataArray（也可以是 `LazyDataset`）
+    :param extent: 地图范围（西、东、南、北），为 None 时原样返回
+    :param sigma: 之后要做的平滑的高斯核标准差
+
+    ## Example:
+    ```python
+    cape = crop(surface_data, (105, 121, 20, 28))["cape"].sel(valid_time=time)
+    z = smoothed(crop(geopotential_data, (105, 121, 20, 28), sigma=2)["z_dagpm"], 2)
+    ```
+    """
+    if extent is None:
+        return data
+    lat, lon = index_window(
+        data["longitude"].values, data["latitude"].values, extent, halo(sigma)
+    )
+    return data.isel(latitude=lat, longitude=lon)
+
+
+def clear_cache():
+    """
+    丢弃已缓存的下标区间。
+    """
+    with _lock:
+        _windows.clear()
@@ -0,0 +1,118 @@
+"""
+带缓存的高斯平滑。
+
+绘图前常要对高度场、海平面气压、温度、温度露点差做高斯平滑。过去各图分别对二维切片调用
+`gaussian_filter`，再写回 `.values`：同一个场在每张图里重复平滑，写回还会改动共享的数据集。
+
+`smoothed` 对传入的整个 (时间, 气压层, 纬度, 经度) 数据块只在经纬度方向平滑，一次调用完成；
+数据由 dask 分块时，各块并行平滑。结果按 (变量, 气压层, sigma, 数据内容) 缓存在进程内，
+并设为只读，不修改也不共享源数据。
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+import xarray
+from dask.base import tokenize
+from scipy.ndimage import gaussian_filter
+
+SPATIAL_DIMS = ("latitude", "longitude")
+"""只在这两个维度上平滑"""
+
+MAX_BYTES = 256 * 1024**2
+"""缓存的平滑结果总大小上限，超出时丢弃最久未使用的结果"""
+
+_cache: OrderedDict[tuple, xarray.DataArray] = OrderedDict()
+_cache_bytes = 0
+_lock = Lock()
+
+
+def _filter(values: np.ndarray, sigma: float, ndim: int) -> np.ndarray:
+    # apply_ufunc 把核心维度（经纬度）移到最后，其余维度的 sigma 为 0，即逐层独立平滑
+    sigmas = [0] * (values.ndim - ndim) + [sigma] * ndim
+    return gaussian_filter(values, sigmas)
+
+
+def _level(field: xarray.DataArray):
+    if "pressure_level" not in field.coords:
+        return None
+    level = field["pressure_level"].values
+    return level.item() if level.ndim == 0 else tuple(level.tolist())
+
+
+def smooth(
+    field: xarray.DataArray, sigma: float, dims: tuple[str, ...] = SPATIAL_DIMS
+) -> xarray.DataArray:
+    """
+    在 `dims` 方向上对 `field` 做高斯平滑，不缓存。其余维度（时间、气压层）逐层独立处理，
+    结果与对每个二维切片分别调用 `gaussian_filter(slice, sigma)` 相同。
+    `field` 由 dask 分块时返回惰性结果，计算时各块并行。
+
+    :param field: 至少包含 `dims` 维度的数据
+    :param sigma: 高斯核标准差，单位为格点
+    :param dims: 平滑的维度
+    """
+    if field.chunks is not None:
+        # 平滑方向不能跨块，其余维度保持原有分块以便并行
+        field = field.chunk({dim: -1 for dim in dims})
+    result = xarray.apply_ufunc(
+        _filter,
+        field,
+        kwargs={"sigma": sigma, "ndim": len(dims)},
+        input_core_dims=[list(dims)],
+        output_core_dims=[list(dims)],
+        dask="parallelized",
+        output_dtypes=[field.dtype],
+        keep_attrs=True,
+    )
+    return result.transpose(*field.dims)
+
+
+def smoothed(
+    field: xarray.DataArray, sigma: float, dims: tuple[str, ...] = SPATIAL_DIMS
+) -> xarray.DataArray:
+    """
+    平滑后的 `field`，按 (变量名, 气压层, sigma, 数据内容) 缓存。返回的数据已经计算好且只读，
+    需要修改时先 `.copy()`。
+
+    一次传入需要的整个数据块（例如全部气压层）比逐层调用更快：平滑一次完成，之后按层选取都命中缓存。
+
+    :param field: 至少包含 `dims` 维度的数据，可以是 dask 上的惰性数据
+    :param sigma: 高斯核标准差，单位为格点；为 0 或 None 时不平滑，只读入数据
+    :param dims: 平滑的维度
+
+    ## Example:
+    ```python
+    z = smoothed(geopotential_data["z_dagpm"].sel(valid_time=time, pressure_level="500"), 5)
+    t_td = smoothed(t_td_all_levels, 2).sel(pressure_level="925")
+    ```
+    """
+    global _cache_bytes
+    if not sigma:
+        return field.compute()
+    key = (field.name, _level(field), sigma, tuple(dims), tokenize(field))
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = smooth(field, sigma, dims).compute()
+    result.values.flags.writeable = False
+    with _lock:
+        if key not in _cache:
+            _cache[key] = result
+            _cache_bytes += result.nbytes
+            while _cache_bytes > MAX_BYTES and len(_cache) > 1:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= evicted.nbytes
+        return _cache[key]
+
+
+def clear_cache():
+    """
+    丢弃已缓存的平滑结果。
+    """
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
@@ -0,0 +1,175 @@
+"""
+MICAPS 第 5 类（TLOGP）探空资料的站点索引。
+
+探空文件只读取一次，全部廓线按 (站号, 时刻) 排序后存放在每个要素一条的连续数组中，
+每条廓线对应其中的一个切片，按站号和时刻查找廓线只需一次字典查询。
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+FIELDS = (
+    "pressure",
+    "height",
+    "temperature",
+    "dewpoint",
+    "wind_angle",
+    "wind_speed",
+)
+"""每层记录的要素，与 `nmc_met_io.read_micaps.read_micaps_5` 的列名一致"""
+
+
+@dataclass(frozen=True)
+class Profile:
+    """
+    单站单时次的探空廓线。各要素数组是 `SoundingStore` 中连续数组的只读视图，不复制数据。
+    """
+
+    station: str
+    time: pd.Timestamp
+    lon: float
+    lat: float
+    alt: float
+    pressure: np.ndarray
+    """气压，单位为百帕"""
+    height: np.ndarray
+    """位势高度，单位为位势什米"""
+    temperature: np.ndarray
+    """温度，单位为摄氏度"""
+    dewpoint: np.ndarray
+    """露点温度，单位为摄氏度"""
+    wind_angle: np.ndarray
+    """风向，单位为度"""
+    wind_speed: np.ndarray
+    """风速，单位为米每秒"""
+
+    def __len__(self) -> int:
+        return len(self.pressure)
+
+
+class SoundingStore:
+    """
+    按 (站号, 时刻) 索引的探空廓线库。
+
+    ## Example:
+    ```python
+    from lib.sounding import SoundingStore
+
+    store = SoundingStore.from_files(["TLOGP/20240427080000.000"])
+    profile = store.profile("59280", "2024-04-27 08:00")
+    for profile in store.profiles("2024-04-27 08:00"):
+        ...
+    ```
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        :param frame: `read_micaps_5` 格式的表，每行是一层记录，包含 ID、lon、lat、alt、time 与 `FIELDS` 各列
+        """
+        frame = frame.sort_values(["ID", "time"], kind="stable")
+        self.arrays: dict[str, np.ndarray] = {}
+        for field in FIELDS:
+            array = np.ascontiguousarray(
+                frame[field].to_numpy(np.float64, na_value=np.nan)
+            )
+            array.flags.writeable = False
+            self.arrays[field] = array
+
+        stations = frame["ID"].astype(str).to_numpy()
+        times = pd.DatetimeIndex(frame["time"])
+        # 站号或时刻变化的位置即廓线的起点
+        starts = np.flatnonzero(
+            np.r_[True, (stations[1:] != stations[:-1]) | (times[1:] != times[:-1])]
+        )
+        stops = np.r_[starts[1:], len(frame)]
+        lon, lat, alt = (frame[c].to_numpy(np.float64) for c in ("lon", "lat", "alt"))
+
+        self._index: dict[tuple[str, pd.Timestamp], Profile] = {}
+        self._latest: dict[str, pd.Timestamp] = {}
+        self._by_time: dict[pd.Timestamp, list[Profile]] = {}
+        for start, stop in zip(starts, stops):
+            station, time = stations[start], times[start]
+            profile = self._index[station, time] = Profile(
+                station,
+                time,
+                float(lon[start]),
+                float(lat[start]),
+                float(alt[start]),
+                **{f: self.arrays[f][start:stop] for f in FIELDS},
+            )
+            self._by_time.setdefault(time, []).append(profile)
+            self._latest[station] = max(time, self._latest.get(station, time))
+
+    @classmethod
+    def from_files(cls, files: Iterable[str]) -> "SoundingStore":
+        """
+        读取若干 TLOGP 文件建立廓线库。文件经 `lib.micaps_cache` 缓存，重复建立时不再解析文本。
+
+        :param files: TLOGP 文件路径
+        """
+        from .micaps_cache import cached_read_micaps_5
+
+        frames = [cached_read_micaps_5(f) for f in files]
+        frames = [f for f in frames if f is not None]
+        if not frames:
+            raise ValueError("no sounding records found")
+        return cls(pd.concat(frames, ignore_index=True))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self):
+        # 数据全部在内存中，无需释放；与 xarray Dataset 接口一致，便于由 `LazyDataset` 管理
+        pass
+
+    def __contains__(self, key: tuple[str, str | datetime]) -> bool:
+        station, time = key
+        return (str(station), pd.Timestamp(time)) in self._index
+
+    def __iter__(self) -> Iterator[Profile]:
+        return iter(self._index.values())
+
+    @property
+    def stations(self) -> list[str]:
+        """
+        全部站号。
+        """
+        return list(self._latest)
+
+    @property
+    def times(self) -> list[pd.Timestamp]:
+        """
+        全部时刻，按时间排序。
+        """
+        return sorted(self._by_time)
+
+    def profile(self, station: str, time: str | datetime | None = None) -> Profile:
+        """
+        查找单站单时次的廓线。
+
+        :param station: 站号，例如 `"59280"`
+        :param time: 观测时刻，默认为该站最新的时次
+        """
+        station = str(station)
+        if time is None:
+            if station not in self._latest:
+                raise KeyError(f"station {station} not found")
+            time = self._latest[station]
+        try:
+            return self._index[station, pd.Timestamp(time)]
+        except KeyError:
+            raise KeyError(f"no sounding for station {station} at {time}") from None
+
+    def profiles(self, time: str | datetime | None = None) -> Iterator[Profile]:
+        """
+        遍历廓线，便于逐站批量绘图。
+
+        :param time: 只遍历该时刻的廓线，默认遍历全部
+        """
+        if time is None:
+            return iter(self)
+        return iter(self._by_time.get(pd.Timestamp(time), []))
@@ -0,0 +1,190 @@
+"""
+多帧绘图的底图模板。
+
+海岸线、行政边界、经纬网等静态图层只绘制一次并缓存为位图背景，之后每一帧先恢复背景，
+再只绘制该帧的数据图层（等值线、风羽、标题），而不是每帧重建整张图。
+等值线每帧重新生成，风羽和标题原地更新数据。
+"""
+
+import gc
+import time
+from typing import Callable
+
+import cartopy.crs as ccrs
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.quiver import Barbs
+from xarray import DataArray, Dataset
+
+from .map import Map
+
+COLLECT_EVERY = 10
+"""每渲染多少帧做一次完整的垃圾回收"""
+
+
+class MapTemplate:
+    """
+    以 `Map` 的静态图层为背景的多帧绘图模板。
+
+    ## Example:
+    ```python
+    from lib import Map, geopotential_data
+    from lib.template import MapTemplate
+
+    template = MapTemplate(
+        Map(geopotential_data).common().gridlines().title("placeholder", fontsize=20)
+    )
+
+    def frame(template: MapTemplate, time: str):
+        data = geopotential_data[["z_dagpm", "u", "v"]].sel(valid_time=time, pressure_level="500").load()
+        template.contour(data["z_dagpm"], levels=np.arange(0, 1000, 4), colors="black")
+        template.barbs(template.map.thin(data), "u", "v")
+        template.title(f"{time} 500hPa", fontsize=20)
+
+    for i, time in enumerate(times):
+        template.render(lambda t: frame(t, time), f"frames/{i:03d}.png")
+    print(f"{template.fps:.1f} fps")
+    ```
+    """
+
+    def __init__(
+        self, map: Map, extent: tuple[float, float, float, float] | None = None
+    ):
+        """
+        绘制 `map` 当前已有的全部图层并缓存为背景。之后图的范围和布局固定，每帧不再重新计算。
+        逐帧设置的标题不参与布局，需要时先用 `map.title` 设置一个字号相同的占位标题。
+
+        :param map: 已经绘制好静态图层的地图
+        :param extent: 地图范围（西、东、南、北），默认为 `map.extent`，未指定时为 `map.data` 的经纬度范围。
+            逐帧绘图时不再按数据自动调整范围，因此须在缓存背景前确定
+        """
+        self.map = map
+        self.fig = map.fig
+        self.ax = map.ax
+        if extent is None:
+            extent = map.extent
+        if extent is None and "longitude" in getattr(map.data, "coords", {}):
+            lon, lat = map.data["longitude"], map.data["latitude"]
+            extent = (
+                float(lon.min()),
+                float(lon.max()),
+                float(lat.min()),
+                float(lat.max()),
+            )
+        if extent is not None:
+            self.ax.set_extent(extent, ccrs.PlateCarree())
+        if not isinstance(self.fig.canvas, FigureCanvasAgg):
+            FigureCanvasAgg(self.fig)
+        self.canvas: FigureCanvasAgg = self.fig.canvas
+        # 先按当前标题（可以是占位标题）计算布局，再固定布局；标题每帧变化，不进入背景
+        self.canvas.draw()
+        self.fig.set_layout_engine("none")
+        self.ax.title.set_animated(True)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+        self._transient: list[Artist] = []
+        self._labels: list[Artist] = []
+        self._barbs: dict[tuple[str, str], Barbs] = {}
+        self.frames = 0
+        """已渲染的帧数"""
+        self.elapsed = 0.0
+        """渲染全部帧的累计耗时，单位为秒"""
+
+    @property
+    def fps(self) -> float:
+        """
+        平均每秒渲染的帧数。
+        """
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    def _track(self, *artists: Artist):
+        for artist in artists:
+            artist.set_animated(True)
+            artist.set_clip_path(self.ax.patch)
+            self._transient.append(artist)
+
+    def contour(self, field: DataArray, **kwargs):
+        """
+        绘制本帧的等值线，参数同 `Map.contour`。
+        """
+        cs = self.map.contour(field, **kwargs)
+        self._track(cs)
+        return cs
+
+    def contourf(self, field: DataArray, **kwargs):
+        """
+        绘制本帧的填色图，参数同 `Map.contourf`。色标属于静态图层，应在创建模板前绘制，这里不添加色标。
+        """
+        kwargs["add_colorbar"] = False
+        kwargs.pop("cbar_kwargs", None)
+        cs = self.map.contourf(field, **kwargs)
+        self._track(cs)
+        return cs
+
+    def clabel(self, cs, **kwargs):
+        """
+        为本帧的等值线添加标注，参数同 `Axes.clabel`。
+        """
+        texts = self.ax.clabel(cs, **kwargs)
+        # 标注随等值线一起移除，这里只记录以便绘制
+        for text in texts:
+            text.set_animated(True)
+        self._labels += texts
+        return texts
+
+    def barbs(self, data: Dataset, u: str, v: str, **kwargs) -> Barbs:
+        """
+        绘制风羽。同一对变量的风羽只在第一帧创建，之后原地更新风矢量。
+        各帧的网格须相同，参数同 `Map.barbs`。
+        """
+        barbs = self._barbs.get((u, v))
+        if barbs is None:
+            barbs = self._barbs[u, v] = self.map.barbs(data, u, v, **kwargs)
+            barbs.set_animated(True)
+            return barbs
+        grid = self.map.vector_grid(data)
+        barbs.set_UVC(*grid.rotate(data[u].values, data[v].values))
+        return barbs
+
+    def title(self, title: str, **fontdict):
+        """
+        设置本帧的标题。
+        """
+        self.ax.set_title(title, **fontdict)
+
+    def render(
+        self, draw: Callable[["MapTemplate"], None], save_path: str | None = None
+    ) -> np.ndarray:
+        """
+        渲染一帧：移除上一帧的图层，调用 `draw` 绘制本帧，再叠加到背景上。
+
+        :param draw: 绘制本帧数据图层的函数，参数为模板本身
+        :param save_path: 保存本帧图片的路径，默认不保存
+        :return: 本帧的 RGBA 图像，形状为 (高, 宽, 4)
+        """
+        start = time.perf_counter()
+        for artist in self._transient:
+            artist.remove()
+        self._transient = []
+        self._labels = []
+        draw(self)
+
+        self.canvas.restore_region(self.background)
+        artists = [*self._transient, *self._labels, *self._barbs.values()]
+        for artist in [*artists, self.ax.title]:
+            self.fig.draw_artist(artist)
+        self.canvas.blit(self.fig.bbox)
+        image = np.array(self.canvas.buffer_rgba())
+        if save_path is not None:
+            plt.imsave(save_path, image)
+
+        self.frames += 1
+        if self.frames % COLLECT_EVERY == 0:
+            # 移除的等值线与其数据之间存在循环引用，要等到完整回收才释放。
+            # 定期回收，使内存占用不随帧数增长
+            gc.collect()
+        self.elapsed += time.perf_counter() - start
+        return image
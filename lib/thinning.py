@@ -0,0 +1,96 @@
+"""
+按屏幕间距抽稀风羽、风矢。
+
+过去按固定步长（每 15 或 20 个格点）抽取风羽：兰伯特投影下高纬格点在屏幕上更密，风羽挤在一起，
+低纬又显得稀疏；区域图和全区域图也只能共用同一个步长。每个风羽都是一条复杂的路径，画得越多越慢。
+
+这里在目标投影下，以固定的屏幕间距（单位为点，1/72 英寸，与 dpi 无关）铺一张规则的格子，
+用投影后格点坐标的 k-d 树为每个格子点找最近的格点，距离超过半个间距的（落在数据之外）舍去。
+选出的风羽在屏幕上均匀分布，数量只取决于图的大小。
+k-d 树按 (网格, 投影) 缓存，选出的格点按 (网格, 投影, 显示范围, 图的尺寸, 间距) 缓存。
+"""
+
+from threading import Lock
+
+import cartopy.crs as ccrs
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .mesh import ProjectedGrid, grid_key, projected_grid
+
+BARB_SPACING = 30
+"""风羽之间的默认屏幕间距，单位为点，约为默认风羽长度的 1.2 倍"""
+
+_trees: dict[tuple, tuple[cKDTree, np.ndarray]] = {}
+_selections: dict[tuple, tuple[np.ndarray, np.ndarray]] = {}
+_lock = Lock()
+
+
+def _tree(lon: np.ndarray, lat: np.ndarray, prj: ccrs.Projection, key: tuple):
+    entry = _trees.get(key)
+    if entry is None:
+        grid: ProjectedGrid = projected_grid(lon, lat, prj)
+        points = np.column_stack([grid.x.ravel(), grid.y.ravel()])
+        valid = np.flatnonzero(np.isfinite(points).all(axis=1))
+        entry = (cKDTree(points[valid]), valid)
+        with _lock:
+            _trees[key] = entry
+    return entry
+
+
+def thin_indices(
+    lon,
+    lat,
+    prj: ccrs.Projection,
+    view: tuple[float, float, float, float],
+    size: tuple[float, float],
+    spacing: float = BARB_SPACING,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    在 `view` 范围内以 `spacing` 的屏幕间距选出格点，返回 (纬度下标, 经度下标)。
+
+    :param lon: 一维经度
+    :param lat: 一维纬度
+    :param prj: 地图投影
+    :param view: 显示范围在投影坐标下的 (x0, x1, y0, y1)
+    :param size: 坐标轴在图上的 (宽, 高)，单位为英寸
+    :param spacing: 相邻格子点的屏幕间距，单位为点
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    grid = grid_key(lon, lat, prj)
+    # 范围与尺寸取有限位数，避免浮点误差导致缓存不命中
+    key = (
+        grid,
+        tuple(np.round(view, 3)),
+        tuple(np.round(size, 3)),
+        float(spacing),
+    )
+    selection = _selections.get(key)
+    if selection is not None:
+        return selection
+
+    tree, valid = _tree(lon, lat, prj, grid)
+    x0, x1, y0, y1 = view
+    width, height = size
+    # 投影坐标下对应 spacing 点的距离，GeoAxes 横纵比例相同，取两个方向的平均
+    step = spacing / 72 * ((x1 - x0) / width + (y1 - y0) / height) / 2
+    xs = np.arange(min(x0, x1) + step / 2, max(x0, x1), step)
+    ys = np.arange(min(y0, y1) + step / 2, max(y0, y1), step)
+    targets = np.column_stack([a.ravel() for a in np.meshgrid(xs, ys)])
+    distance, nearest = tree.query(targets, distance_upper_bound=step / 2)
+    found = np.unique(valid[nearest[np.isfinite(distance)]])
+    iy, ix = np.unravel_index(found, (lat.size, lon.size))
+    selection = (iy, ix)
+    with _lock:
+        _selections[key] = selection
+    return selection
+
+
+def clear_cache():
+    """
+    丢弃已缓存的 k-d 树和选出的格点。
+    """
+    with _lock:
+        _trees.clear()
+        _selections.clear()
@@ -41,3 +41,9 @@ plt.rcParams["font.family"] = ["Heiti TC", "sans-serif"]
 # draw_p4_11()
 # draw_p4_12()
 # plt.show()
+
+# 多进程重新生成全部论文图片，见 lib/batch.py。多进程要求放在 __main__ 判断中
+# if __name__ == "__main__":
+#     from lib.batch import run, thesis_jobs
+#
+#     run(thesis_jobs(), preload=("geopotential_data", "surface_data"))